@@ -1,14 +1,20 @@
 # api/endpoints.py
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
 from typing import Optional
+import csv
+import io
+import json
 import logging
 from datetime import datetime, timedelta
-import asyncio
 from config import MAX_DEPTH, MAX_URLS, DB_NAME
 from license.license import is_valid_license, create_license
-from crawler.crawler import crawl
-from database.db import get_results
+from crawler.jobs import job_manager, JobLimitError
+from crawler.frontier import canonicalize_url
+from utils.metrics import registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from database.db import (get_results, get_db, iter_result_chunks, get_outlinks, get_inlinks, search_results,
+                         EXPORT_FIELDS)
 
 router = APIRouter()
 
@@ -21,43 +27,182 @@ class CrawlRequest(BaseModel):
     url: str
     max_depth: Optional[int] = MAX_DEPTH
     max_urls: Optional[int] = MAX_URLS
+    incremental: Optional[bool] = False
+    shared: Optional[bool] = False
 
-@router.post('/crawl')
-async def start_crawl(request: CrawlRequest):
+@router.post('/crawl', status_code=202)
+async def start_crawl(request: CrawlRequest, db=Depends(get_db)):
     logger.info(f"Received crawl request: {request}")
 
-    if not await is_valid_license(request.license_key):
+    if not await is_valid_license(request.license_key, db):
         logger.warning(f"Invalid or expired license key: {request.license_key}")
         raise HTTPException(status_code=403, detail="Invalid or expired license key")
 
-    # Start the crawl task
-    task = asyncio.create_task(crawl(request.url, request.max_depth, request.max_urls))
-    
-    # Wait for the crawl to complete
     try:
-        crawled_urls = await task
-        logger.info(f"Crawl completed for {request.url}. Total URLs crawled: {crawled_urls}")
-        return {"message": f"Crawl completed successfully. Total URLs crawled: {crawled_urls}"}
-    except Exception as e:
-        logger.error(f"Error during crawl: {str(e)}")
-        raise HTTPException(status_code=500, detail="An error occurred during the crawl")
+        job_id = await job_manager.submit(request.license_key, request.url, request.max_depth,
+                                          request.max_urls, request.incremental, request.shared)
+    except JobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return {"message": "Crawl started", "job_id": job_id, "status": "queued"}
+
+# Job columns returned by GET /crawl/{job_id}; license_key and the owner/heartbeat
+# bookkeeping of the process running the job stay internal.
+JOB_STATUS_FIELDS = ('id', 'url', 'max_depth', 'max_urls', 'incremental', 'shared', 'status', 'pages_crawled',
+                     'pages_queued', 'error', 'created_at', 'started_at', 'finished_at')
+
+async def get_owned_job(job_id, license_key, db):
+    if not await is_valid_license(license_key, db):
+        logger.warning(f"Invalid or expired license key: {license_key}")
+        raise HTTPException(status_code=403, detail="Invalid or expired license key")
+
+    job = await job_manager.status(job_id, db)
+    if job is None or job['license_key'] != license_key:
+        raise HTTPException(status_code=404, detail="Crawl job not found")
+    return job
+
+@router.get('/crawl/{job_id}')
+async def get_crawl_status(job_id: str, license_key: str, db=Depends(get_db)):
+    job = await get_owned_job(job_id, license_key, db)
+    return {field: job[field] for field in JOB_STATUS_FIELDS}
+
+@router.delete('/crawl/{job_id}')
+async def cancel_crawl(job_id: str, license_key: str, db=Depends(get_db)):
+    await get_owned_job(job_id, license_key, db)
+    if not await job_manager.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Crawl job already finished")
+    return {"message": "Crawl cancellation requested", "job_id": job_id}
+
+@router.post('/crawl/{job_id}/resume', status_code=202)
+async def resume_crawl(job_id: str, license_key: str, db=Depends(get_db)):
+    await get_owned_job(job_id, license_key, db)
+    try:
+        resumed = await job_manager.resume(job_id)
+    except JobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    if not resumed:
+        raise HTTPException(status_code=409, detail="Only failed, cancelled or interrupted jobs can be resumed")
+    return {"message": "Crawl resumed", "job_id": job_id, "status": "queued"}
 
 @router.get('/results')
-async def get_crawl_results(license_key: str, page: int = 1, per_page: int = 20):
+async def get_crawl_results(license_key: str, page: int = 1, per_page: int = 20,
+                            after: Optional[str] = None, include_body: bool = True, db=Depends(get_db)):
     logger.debug(f"Received request for crawl results. License key: {license_key}")
 
-    if not await is_valid_license(license_key):
+    if not await is_valid_license(license_key, db):
+        logger.warning(f"Invalid or expired license key: {license_key}")
+        raise HTTPException(status_code=403, detail="Invalid or expired license key")
+
+    page = max(1, page)
+    per_page = max(1, min(per_page, 100))
+    try:
+        results, total_results, next_cursor = await get_results(page, per_page, db, after, include_body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "results": results,
+        "page": page,
+        "per_page": per_page,
+        "total_results": total_results,
+        "next": next_cursor
+    }
+
+@router.get('/search')
+async def search_crawls(license_key: str, q: str, page: int = 1, per_page: int = 20, db=Depends(get_db)):
+    logger.debug(f"Received search request. License key: {license_key}")
+
+    if not await is_valid_license(license_key, db):
         logger.warning(f"Invalid or expired license key: {license_key}")
         raise HTTPException(status_code=403, detail="Invalid or expired license key")
 
-    results, total_results = await get_results(page, per_page)
+    page = max(1, page)
+    per_page = max(1, min(per_page, 100))
+    try:
+        results = await search_results(q, page, per_page, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
         "results": results,
         "page": page,
         "per_page": per_page,
-        "total_results": total_results
+        "next": page + 1 if len(results) == per_page else None
     }
 
+async def ndjson_stream(chunks):
+    async for rows in chunks:
+        yield ('\n'.join(json.dumps(row, ensure_ascii=False) for row in rows) + '\n').encode()
+
+def csv_value(value):
+    # Link lists are written as a JSON array in a single cell.
+    return json.dumps(value, ensure_ascii=False) if isinstance(value, list) else value
+
+async def csv_stream(chunks, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    async for rows in chunks:
+        writer.writerows([csv_value(row[field]) for field in fields] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+@router.get('/export')
+async def export_results(license_key: str, format: str = 'ndjson', job_id: Optional[str] = None,
+                         since: Optional[str] = None, until: Optional[str] = None,
+                         min_depth: Optional[int] = None, max_depth: Optional[int] = None,
+                         fields: Optional[str] = None):
+    logger.debug(f"Received export request. License key: {license_key}")
+
+    # No Depends(get_db): a yield dependency stays open until the streamed
+    # response finishes, and iter_result_chunks borrows readers of its own.
+    if not await is_valid_license(license_key):
+        logger.warning(f"Invalid or expired license key: {license_key}")
+        raise HTTPException(status_code=403, detail="Invalid or expired license key")
+
+    if format not in ('ndjson', 'csv'):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+    selected = tuple(f.strip() for f in fields.split(',')) if fields else EXPORT_FIELDS
+    unknown = set(selected) - set(EXPORT_FIELDS)
+    if unknown:
+        # Checked here because errors raised once streaming starts cannot change the status code.
+        raise HTTPException(status_code=400, detail=f"Unknown export fields: {', '.join(sorted(unknown))}")
+
+    chunks = iter_result_chunks(selected, job_id, since, until, min_depth, max_depth)
+    if format == 'csv':
+        body, media_type = csv_stream(chunks, selected), 'text/csv'
+    else:
+        body, media_type = ndjson_stream(chunks), 'application/x-ndjson'
+    return StreamingResponse(body, media_type=media_type, headers={
+        'Content-Disposition': f'attachment; filename="crawls.{format}"'
+    })
+
+def link_page(links, limit):
+    return {
+        "links": [{"url": link['url'], "internal": link['internal']} for link in links],
+        "next": links[-1]['id'] if len(links) == limit else None
+    }
+
+@router.get('/links/out')
+async def get_page_outlinks(license_key: str, url: str, internal: Optional[bool] = None, limit: int = 100,
+                            after: int = 0, db=Depends(get_db)):
+    if not await is_valid_license(license_key, db):
+        logger.warning(f"Invalid or expired license key: {license_key}")
+        raise HTTPException(status_code=403, detail="Invalid or expired license key")
+
+    limit = max(1, min(limit, 1000))
+    return link_page(await get_outlinks(canonicalize_url(url) or url, internal, limit, after, db), limit)
+
+@router.get('/links/in')
+async def get_page_inlinks(license_key: str, url: str, internal: Optional[bool] = None, limit: int = 100,
+                           after: int = 0, db=Depends(get_db)):
+    if not await is_valid_license(license_key, db):
+        logger.warning(f"Invalid or expired license key: {license_key}")
+        raise HTTPException(status_code=403, detail="Invalid or expired license key")
+
+    limit = max(1, min(limit, 1000))
+    return link_page(await get_inlinks(canonicalize_url(url) or url, internal, limit, after, db), limit)
+
 class LicenseRequest(BaseModel):
     key: str
     type: str
@@ -74,4 +219,8 @@ async def create_license_endpoint(request: LicenseRequest):
     if success:
         return {"message": "License created successfully"}
     else:
-        raise HTTPException(status_code=400, detail="Failed to create license")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail="Failed to create license")
+
+@router.get('/metrics')
+async def metrics():
+    return Response(registry.render(), media_type=METRICS_CONTENT_TYPE)
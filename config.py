@@ -18,6 +18,65 @@ def get_config():
         'LOG_LEVEL': os.getenv('LOG_LEVEL', 'INFO'),
         'CRAWLER_TIMEOUT': int(os.getenv('CRAWLER_TIMEOUT', 60)),
         'MAX_CONCURRENT_CRAWLS': int(os.getenv('MAX_CONCURRENT_CRAWLS', 10)),
+        'CRAWL_WORKERS': int(os.getenv('CRAWL_WORKERS', 10)),
+        'USER_AGENT': os.getenv('USER_AGENT', 'qMiner/1.0'),
+        'HTTP_CONNECT_TIMEOUT': float(os.getenv('HTTP_CONNECT_TIMEOUT', 10)),
+        'HTTP_READ_TIMEOUT': float(os.getenv('HTTP_READ_TIMEOUT', 30)),
+        'HTTP_POOL_SIZE': int(os.getenv('HTTP_POOL_SIZE', 100)),
+        'HTTP_POOL_PER_HOST': int(os.getenv('HTTP_POOL_PER_HOST', 8)),
+        'HTTP_DNS_TTL': int(os.getenv('HTTP_DNS_TTL', 300)),
+        'HTTP_KEEPALIVE': float(os.getenv('HTTP_KEEPALIVE', 30)),
+        'HOST_RATE': float(os.getenv('HOST_RATE', 2)),
+        'HOST_BURST': int(os.getenv('HOST_BURST', 4)),
+        'ROBOTS_TTL': int(os.getenv('ROBOTS_TTL', 3600)),
+        'RESPECT_ROBOTS': os.getenv('RESPECT_ROBOTS', 'True').lower() in ('true', '1', 't'),
+        'DB_READERS': int(os.getenv('DB_READERS', 4)),
+        'WRITE_BATCH_SIZE': int(os.getenv('WRITE_BATCH_SIZE', 200)),
+        'WRITE_FLUSH_INTERVAL': float(os.getenv('WRITE_FLUSH_INTERVAL', 1.0)),
+        'WRITE_QUEUE_SIZE': int(os.getenv('WRITE_QUEUE_SIZE', 5000)),
+        'WRITE_BUSY_TIMEOUT': float(os.getenv('WRITE_BUSY_TIMEOUT', 30)),
+        'WRITE_RETRIES': int(os.getenv('WRITE_RETRIES', 5)),
+        'LICENSE_CACHE_SIZE': int(os.getenv('LICENSE_CACHE_SIZE', 10000)),
+        'LICENSE_CACHE_TTL': float(os.getenv('LICENSE_CACHE_TTL', 300)),
+        'LICENSE_CACHE_NEGATIVE_TTL': float(os.getenv('LICENSE_CACHE_NEGATIVE_TTL', 30)),
+        'MAX_CONCURRENT_JOBS': int(os.getenv('MAX_CONCURRENT_JOBS', 2)),
+        'MAX_PENDING_JOBS': int(os.getenv('MAX_PENDING_JOBS', 50)),
+        'JOB_PROGRESS_INTERVAL': float(os.getenv('JOB_PROGRESS_INTERVAL', 5)),
+        'JOB_HEARTBEAT_TTL': float(os.getenv('JOB_HEARTBEAT_TTL', 60)),
+        'FRONTIER_CHECKPOINT_INTERVAL': float(os.getenv('FRONTIER_CHECKPOINT_INTERVAL', 5)),
+        'FRONTIER_LEASE_TTL': float(os.getenv('FRONTIER_LEASE_TTL', 60)),
+        'FRONTIER_LEASE_BATCH': int(os.getenv('FRONTIER_LEASE_BATCH', 50)),
+        'FRONTIER_POLL_INTERVAL': float(os.getenv('FRONTIER_POLL_INTERVAL', 1.0)),
+        'SEEN_SET': os.getenv('SEEN_SET', 'exact'),
+        'BLOOM_CAPACITY': int(os.getenv('BLOOM_CAPACITY', 1000000)),
+        'BLOOM_ERROR_RATE': float(os.getenv('BLOOM_ERROR_RATE', 0.001)),
+        'RESUME_INTERRUPTED_JOBS': os.getenv('RESUME_INTERRUPTED_JOBS', 'False').lower() in ('true', '1', 't'),
+        'EXPORT_CHUNK_SIZE': int(os.getenv('EXPORT_CHUNK_SIZE', 500)),
+        'FETCH_MODE': os.getenv('FETCH_MODE', 'static'),
+        'RENDER_BROWSERS': int(os.getenv('RENDER_BROWSERS', 2)),
+        'RENDER_CONCURRENCY': int(os.getenv('RENDER_CONCURRENCY', 4)),
+        'RENDER_PAGES_PER_BROWSER': int(os.getenv('RENDER_PAGES_PER_BROWSER', 200)),
+        'RENDER_TIMEOUT': float(os.getenv('RENDER_TIMEOUT', 30)),
+        'RENDER_BLOCK_TYPES': os.getenv('RENDER_BLOCK_TYPES', 'image,media,font,stylesheet').split(','),
+        'RENDER_BLOCK_DOMAINS': os.getenv('RENDER_BLOCK_DOMAINS', 'google-analytics.com,googletagmanager.com,'
+                                          'doubleclick.net,facebook.net,hotjar.com,segment.io').split(','),
+        'RENDER_WAIT': os.getenv('RENDER_WAIT', 'networkidle'),
+        'RENDER_WAIT_TIMEOUT': float(os.getenv('RENDER_WAIT_TIMEOUT', 5)),
+        'RENDER_DECISION_TTL': float(os.getenv('RENDER_DECISION_TTL', 3600)),
+        'RENDER_FAILURE_LIMIT': int(os.getenv('RENDER_FAILURE_LIMIT', 3)),
+        'FETCH_MAX_BYTES': int(os.getenv('FETCH_MAX_BYTES', 5 * 1024 * 1024)),
+        'FETCH_CONTENT_TYPES': os.getenv('FETCH_CONTENT_TYPES', 'text/html,application/xhtml+xml').split(','),
+        'RECORD_DOCUMENTS': os.getenv('RECORD_DOCUMENTS', 'False').lower() in ('true', '1', 't'),
+        'HTML_PARSER': os.getenv('HTML_PARSER', 'lxml'),
+        'PARSE_WORKERS': int(os.getenv('PARSE_WORKERS', min(4, os.cpu_count() or 1))),
+        'PARSE_MAX_PENDING': int(os.getenv('PARSE_MAX_PENDING', 16)),
+        'PARSE_INLINE_MAX_BYTES': int(os.getenv('PARSE_INLINE_MAX_BYTES', 16384)),
+        'NEAR_DUP_DISTANCE': int(os.getenv('NEAR_DUP_DISTANCE', 3)),
+        'NEAR_DUP_SKIP_LINKS': os.getenv('NEAR_DUP_SKIP_LINKS', 'False').lower() in ('true', '1', 't'),
+        'COMPRESSION': os.getenv('COMPRESSION', 'auto'),
+        'COMPRESSION_LEVEL': int(os.getenv('COMPRESSION_LEVEL')) if os.getenv('COMPRESSION_LEVEL') else None,
+        'COMPRESSION_DICT': os.getenv('COMPRESSION_DICT', ''),
+        'TRACKING_PARAMS': os.getenv('TRACKING_PARAMS', 'utm_*,gclid,fbclid,msclkid,mc_cid,mc_eid,_ga,ref').split(','),
         'API_RATE_LIMIT': os.getenv('API_RATE_LIMIT', '100/minute'),
         'DATABASE_URL': os.getenv('DATABASE_URL', f"sqlite:///{os.getenv('DB_NAME', 'crawler.db')}"),
     }
@@ -35,5 +94,63 @@ DEBUG = config['DEBUG']
 LOG_LEVEL = config['LOG_LEVEL']
 CRAWLER_TIMEOUT = config['CRAWLER_TIMEOUT']
 MAX_CONCURRENT_CRAWLS = config['MAX_CONCURRENT_CRAWLS']
+CRAWL_WORKERS = config['CRAWL_WORKERS']
+TRACKING_PARAMS = config['TRACKING_PARAMS']
+COMPRESSION = config['COMPRESSION']
+COMPRESSION_LEVEL = config['COMPRESSION_LEVEL']
+COMPRESSION_DICT = config['COMPRESSION_DICT']
+NEAR_DUP_DISTANCE = config['NEAR_DUP_DISTANCE']
+NEAR_DUP_SKIP_LINKS = config['NEAR_DUP_SKIP_LINKS']
+PARSE_WORKERS = config['PARSE_WORKERS']
+PARSE_MAX_PENDING = config['PARSE_MAX_PENDING']
+PARSE_INLINE_MAX_BYTES = config['PARSE_INLINE_MAX_BYTES']
+HTML_PARSER = config['HTML_PARSER']
+EXPORT_CHUNK_SIZE = config['EXPORT_CHUNK_SIZE']
+MAX_CONCURRENT_JOBS = config['MAX_CONCURRENT_JOBS']
+MAX_PENDING_JOBS = config['MAX_PENDING_JOBS']
+JOB_PROGRESS_INTERVAL = config['JOB_PROGRESS_INTERVAL']
+JOB_HEARTBEAT_TTL = config['JOB_HEARTBEAT_TTL']
+FRONTIER_CHECKPOINT_INTERVAL = config['FRONTIER_CHECKPOINT_INTERVAL']
+FRONTIER_LEASE_TTL = config['FRONTIER_LEASE_TTL']
+FRONTIER_LEASE_BATCH = config['FRONTIER_LEASE_BATCH']
+FRONTIER_POLL_INTERVAL = config['FRONTIER_POLL_INTERVAL']
+RESUME_INTERRUPTED_JOBS = config['RESUME_INTERRUPTED_JOBS']
+SEEN_SET = config['SEEN_SET']
+FETCH_MODE = config['FETCH_MODE']
+RENDER_BROWSERS = config['RENDER_BROWSERS']
+RENDER_CONCURRENCY = config['RENDER_CONCURRENCY']
+RENDER_PAGES_PER_BROWSER = config['RENDER_PAGES_PER_BROWSER']
+RENDER_TIMEOUT = config['RENDER_TIMEOUT']
+RENDER_BLOCK_TYPES = config['RENDER_BLOCK_TYPES']
+RENDER_BLOCK_DOMAINS = config['RENDER_BLOCK_DOMAINS']
+RENDER_WAIT = config['RENDER_WAIT']
+RENDER_WAIT_TIMEOUT = config['RENDER_WAIT_TIMEOUT']
+RENDER_DECISION_TTL = config['RENDER_DECISION_TTL']
+RENDER_FAILURE_LIMIT = config['RENDER_FAILURE_LIMIT']
+FETCH_MAX_BYTES = config['FETCH_MAX_BYTES']
+FETCH_CONTENT_TYPES = config['FETCH_CONTENT_TYPES']
+RECORD_DOCUMENTS = config['RECORD_DOCUMENTS']
+BLOOM_CAPACITY = config['BLOOM_CAPACITY']
+BLOOM_ERROR_RATE = config['BLOOM_ERROR_RATE']
+LICENSE_CACHE_SIZE = config['LICENSE_CACHE_SIZE']
+LICENSE_CACHE_TTL = config['LICENSE_CACHE_TTL']
+LICENSE_CACHE_NEGATIVE_TTL = config['LICENSE_CACHE_NEGATIVE_TTL']
+DB_READERS = config['DB_READERS']
+WRITE_BATCH_SIZE = config['WRITE_BATCH_SIZE']
+WRITE_FLUSH_INTERVAL = config['WRITE_FLUSH_INTERVAL']
+WRITE_QUEUE_SIZE = config['WRITE_QUEUE_SIZE']
+WRITE_BUSY_TIMEOUT = config['WRITE_BUSY_TIMEOUT']
+WRITE_RETRIES = config['WRITE_RETRIES']
+USER_AGENT = config['USER_AGENT']
+HTTP_CONNECT_TIMEOUT = config['HTTP_CONNECT_TIMEOUT']
+HTTP_READ_TIMEOUT = config['HTTP_READ_TIMEOUT']
+HTTP_POOL_SIZE = config['HTTP_POOL_SIZE']
+HTTP_POOL_PER_HOST = config['HTTP_POOL_PER_HOST']
+HTTP_DNS_TTL = config['HTTP_DNS_TTL']
+HTTP_KEEPALIVE = config['HTTP_KEEPALIVE']
+HOST_RATE = config['HOST_RATE']
+HOST_BURST = config['HOST_BURST']
+ROBOTS_TTL = config['ROBOTS_TTL']
+RESPECT_ROBOTS = config['RESPECT_ROBOTS']
 API_RATE_LIMIT = config['API_RATE_LIMIT']
 DATABASE_URL = config['DATABASE_URL']
\ No newline at end of file
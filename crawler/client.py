@@ -0,0 +1,47 @@
+# client.py
+import logging
+import aiohttp
+from config import (USER_AGENT, CRAWLER_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_POOL_SIZE,
+                    HTTP_POOL_PER_HOST, HTTP_DNS_TTL, HTTP_KEEPALIVE)
+
+logger = logging.getLogger(__name__)
+
+class HttpClient:
+    """The application's HTTP connection pool.
+
+    Every crawl opens its own ClientSession, so cookies stay with the crawl
+    that received them, but all sessions share one TCPConnector: keep-alive
+    connections, TLS sessions and cached DNS answers are reused across
+    concurrent jobs. aiohttp decodes gzip and deflate responses, and brotli
+    too when the Brotli package is installed.
+    """
+
+    def __init__(self, limit=HTTP_POOL_SIZE, limit_per_host=HTTP_POOL_PER_HOST, dns_ttl=HTTP_DNS_TTL,
+                 keepalive=HTTP_KEEPALIVE):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self.timeout = aiohttp.ClientTimeout(total=CRAWLER_TIMEOUT, sock_connect=HTTP_CONNECT_TIMEOUT,
+                                             sock_read=HTTP_READ_TIMEOUT)
+        self.connector = None
+
+    async def start(self):
+        if self.connector is None or self.connector.closed:
+            self.connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                                  ttl_dns_cache=self.dns_ttl, keepalive_timeout=self.keepalive)
+            logger.info(f"HTTP connection pool started ({self.limit} connections, {self.limit_per_host} per host)")
+
+    async def close(self):
+        if self.connector is not None:
+            await self.connector.close()
+            self.connector = None
+            logger.info("HTTP connection pool closed")
+
+    async def session(self):
+        """A new ClientSession on the shared connector; close it when the crawl ends."""
+        await self.start()
+        return aiohttp.ClientSession(connector=self.connector, connector_owner=False, timeout=self.timeout,
+                                     headers={'User-Agent': USER_AGENT})
+
+http_client = HttpClient()
@@ -1,78 +1,380 @@
+import hashlib
 import logging
-import json
-from urllib.parse import urljoin, urlparse
+import time
+from urllib.parse import urlparse
 from datetime import datetime
 import asyncio
-import re
-from bs4 import BeautifulSoup
-import aiohttp
-import aiosqlite
-from config import DB_NAME, MAX_URLS
+from crawler.frontier import Frontier, CheckpointedFrontier, LeasedFrontier, canonicalize_url
+from crawler.politeness import HostScheduler
+from crawler.client import http_client
+from crawler.render import browser_pool
+from crawler.hybrid import render_decisions, render_reason
+from crawler.parser import parse_pool
+from crawler.fingerprint import SimHashIndex
+from database.db import (insert_crawl_result, get_url_state, save_url_state, mark_url_seen, get_stored_links,
+                         save_fingerprint, find_near_duplicate, save_links, save_document)
+from database.writer import crawl_writer
+from utils.metrics import fetches, fetched_bytes, fetch_seconds, frontier_size, crawl_workers, busy_workers
+from config import (MAX_URLS, MAX_CONCURRENT_CRAWLS, CRAWL_WORKERS, NEAR_DUP_DISTANCE,
+                    NEAR_DUP_SKIP_LINKS, FETCH_MAX_BYTES, FETCH_CONTENT_TYPES, RECORD_DOCUMENTS, FETCH_MODE)
 
 logger = logging.getLogger(__name__)
 
+# Caps in-flight page fetches across every running crawl in this process.
+fetch_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CRAWLS)
+
+# Shared so that concurrent crawls of the same host are paced together.
+scheduler = HostScheduler()
+
+# Contexts of the crawls running in this process, for the frontier size metric.
+running_crawls = set()
+
+def frontier_sizes():
+    sizes = {}
+    for ctx in running_crawls:
+        key = (ctx.job_id or '',)
+        sizes[key] = sizes.get(key, 0) + len(ctx.frontier)
+    return sizes
+
+frontier_size.collect_with(frontier_sizes)
+
 async def is_internal_link(base_url, link):
     return urlparse(link).netloc == urlparse(base_url).netloc or not urlparse(link).netloc
 
-async def fetch_url(url, session):
+FETCH_CHUNK_SIZE = 64 * 1024
+
+class FetchResult:
+    """A fetched page. body is None when the response was not a page to parse,
+    e.g. a PDF; content_type and content_length then describe what was skipped."""
+
+    __slots__ = ('status', 'body', 'encoding', 'etag', 'last_modified', 'content_type', 'content_length')
+
+    def __init__(self, status, body, encoding, etag=None, last_modified=None, content_type=None,
+                 content_length=None):
+        self.status = status
+        self.body = body
+        self.encoding = encoding
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_type = content_type
+        self.content_length = content_length
+
+def is_page_type(content_type):
+    # No Content-Type at all is common on old servers; give those the benefit of the doubt.
+    return content_type is None or content_type.split(';')[0].strip().lower() in FETCH_CONTENT_TYPES
+
+def conditional_headers(state):
+    headers = {}
+    if state:
+        if state['etag']:
+            headers['If-None-Match'] = state['etag']
+        if state['last_modified']:
+            headers['If-Modified-Since'] = state['last_modified']
+    return headers
+
+async def read_body(response, url, max_bytes=FETCH_MAX_BYTES):
+    """Stream the body, giving up (None) as soon as it exceeds max_bytes."""
+    if response.content_length is not None and response.content_length > max_bytes:
+        logger.warning(f"Skipping {url}: Content-Length {response.content_length} exceeds {max_bytes} bytes")
+        return None
+    chunks = []
+    size = 0
     try:
-        async with session.get(url, timeout=30) as response:
-            return await response.text()
+        async for chunk in response.content.iter_chunked(FETCH_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                logger.warning(f"Skipping {url}: body exceeds {max_bytes} bytes")
+                return None
+            chunks.append(chunk)
+    finally:
+        fetched_bytes.inc('static', amount=size)
+    return b''.join(chunks)
+
+def usable_status(url, status, retry_after=None):
+    """False for throttled and error responses, which are neither parsed nor stored."""
+    if status in (429, 503):
+        scheduler.backoff(url, retry_after)
+        logger.warning(f"Throttled fetching {url}: HTTP {status}")
+        return False
+    if status >= 400:
+        logger.warning(f"Error fetching {url}: HTTP {status}")
+        return False
+    return True
+
+async def fetch_url(url, session, headers=None, mode=FETCH_MODE):
+    """GET url, downloading the body only for successful responses of a page Content-Type.
+
+    Leaving the response unread closes the connection, so skipped
+    downloads stop at the headers. With mode='render' the page is loaded
+    in a headless browser instead and its rendered HTML returned.
+    """
+    if mode == 'render':
+        return await render_url(url, headers)
+    started = time.perf_counter()
+    # Counted once, when the fetch is over: a body that fails to download is an error, not a 200.
+    status = 'error'
+    try:
+        async with session.get(url, headers=headers) as response:
+            status = response.status
+            if not usable_status(url, response.status, response.headers.get('Retry-After')):
+                return None
+            etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+            if response.status == 304:
+                return FetchResult(response.status, b'', response.charset, etag, last_modified)
+
+            content_type = response.headers.get('Content-Type')
+            if not is_page_type(content_type):
+                logger.info(f"Skipping {url}: not a page ({content_type})")
+                return FetchResult(response.status, None, None, content_type=content_type,
+                                   content_length=response.content_length)
+            body = await read_body(response, url)
+            if body is None:
+                return None
+            return FetchResult(response.status, body, response.charset, etag, last_modified, content_type, len(body))
     except Exception as e:
+        status = 'error'
         logger.error(f"Error fetching {url}: {str(e)}")
         return None
+    finally:
+        fetches.inc('static', status)
+        fetch_seconds.observe(time.perf_counter() - started, 'static')
+
+async def render_url(url, headers=None):
+    """Fetch url through the browser pool, as the same FetchResult fetch_url returns."""
+    started = time.perf_counter()
+    try:
+        result = await browser_pool.render(url, headers)
+    except Exception as e:
+        fetches.inc('render', 'error')
+        logger.error(f"Error rendering {url}: {str(e)}")
+        return None
+    finally:
+        fetch_seconds.observe(time.perf_counter() - started, 'render')
+    fetches.inc('render', result.status)
+    if not usable_status(url, result.status, result.headers.get('retry-after')):
+        return None
+    etag, last_modified = result.headers.get('etag'), result.headers.get('last-modified')
+    if result.status == 304:
+        return FetchResult(result.status, b'', 'utf-8', etag, last_modified)
+
+    content_type = result.headers.get('content-type')
+    if not is_page_type(content_type) or result.html is None:
+        logger.info(f"Skipping {url}: not a page ({content_type})")
+        return FetchResult(result.status, None, None, content_type=content_type)
+    body = result.html.encode('utf-8')
+    fetched_bytes.inc('render', amount=len(body))
+    if len(body) > FETCH_MAX_BYTES:
+        logger.warning(f"Skipping {url}: rendered page exceeds {FETCH_MAX_BYTES} bytes")
+        return None
+    return FetchResult(result.status, body, 'utf-8', etag, last_modified, content_type, len(body))
 
-async def crawl_page(url, base_url, depth, max_depth, session):
+async def render_if_needed(url, result, page):
+    """Hybrid mode: re-fetch a static page in the browser if it looks JavaScript-built."""
+    if not render_decisions.can_render(url):
+        return result, page
+    reason = render_reason(result.body, page)
+    render_decisions.record(url, reason is not None)
+    if reason is None:
+        return result, page
+
+    logger.info(f"Rendering {url}: {reason}")
+    await scheduler.wait(url)
+    async with fetch_semaphore:
+        rendered = await render_url(url)
+    render_decisions.record_render(url, rendered is not None)
+    if rendered is None or rendered.body is None:
+        return result, page
+    return rendered, await parse_pool.parse(rendered.body, rendered.encoding, url)
+
+async def crawl_page(url, base_url, depth, max_depth, session, job_id=None, incremental=False, fingerprints=None):
     if depth > max_depth:
         return []
 
     logger.info(f"Crawling: {url} (Depth: {depth})")
-    content = await fetch_url(url, session)
-    if content is None:
+    state = await get_url_state(url) if incremental else None
+    mode = FETCH_MODE
+    if mode == 'hybrid':
+        mode = 'render' if render_decisions.needs_render(url) else 'static'
+    await scheduler.wait(url)
+    async with fetch_semaphore:
+        result = await fetch_url(url, session, conditional_headers(state), mode)
+    fell_back = False
+    if FETCH_MODE == 'hybrid' and mode == 'render':
+        render_decisions.record_render(url, result is not None)
+        if result is None:
+            # The static page beats nothing; it is not checked for rendering again.
+            logger.warning(f"Rendering {url} failed, fetching it statically")
+            mode, fell_back = 'static', True
+            await scheduler.wait(url)
+            async with fetch_semaphore:
+                result = await fetch_url(url, session, conditional_headers(state), mode)
+    if result is None:
         return []
 
-    soup = BeautifulSoup(content, 'html.parser')
+    seen_at = datetime.now().isoformat()
+    if result.body is None:
+        if RECORD_DOCUMENTS:
+            await save_document(url, result.content_type, result.content_length, job_id, seen_at)
+        return []
+    content_hash = hashlib.sha256(result.body).hexdigest() if result.status != 304 else None
+    if state and (result.status == 304 or content_hash == state['content_hash']):
+        # Unchanged since the last crawl: keep the stored row, follow its links.
+        links = await get_stored_links(url)
+        if links is not None:
+            await mark_url_seen(url, seen_at)
+            logger.info(f"Unchanged: {url} (Depth: {depth})")
+            return links
+        if result.status == 304:
+            logger.warning(f"{url} is unchanged but has no stored crawl to reuse")
+            return []
+
+    page = await parse_pool.parse(result.body, result.encoding, url)
+    if FETCH_MODE == 'hybrid' and mode == 'static' and not fell_back:
+        result, page = await render_if_needed(url, result, page)
     internal_links = []
     external_links = []
 
-    for a_tag in soup.find_all('a', href=True):
-        link = urljoin(url, a_tag['href'])
+    # Canonical and deduplicated, so each link is one node in the link graph;
+    # mailto:, javascript: and other unfetchable links are dropped.
+    for link in dict.fromkeys(filter(None, map(canonicalize_url, page.links))):
         if await is_internal_link(base_url, link):
             internal_links.append(link)
         else:
             external_links.append(link)
 
-    body_text = soup.body.get_text(separator=' ', strip=True) if soup.body else ''
-    body_text = re.sub(r'\s+', ' ', body_text).strip()
+    duplicate_of = None
+    if fingerprints is not None and page.simhash is not None:
+        duplicate_of = (fingerprints.find(page.text_hash, page.simhash)
+                        or await find_near_duplicate(url, page.text_hash, page.simhash, fingerprints.distance))
+        if duplicate_of is None:
+            fingerprints.add(page.text_hash, page.simhash, url)
+            await save_fingerprint(url, page.text_hash, page.simhash)
 
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("""
-            INSERT INTO crawls (url, depth, internal_links, external_links, title, body_text, crawled_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (url, depth, json.dumps(internal_links), json.dumps(external_links),
-              soup.title.string if soup.title else None, body_text, datetime.now().isoformat()))
-        await db.commit()
+    # A near-duplicate is stored as a reference to the page it duplicates, without its text.
+    body_text = page.body_text if duplicate_of is None else None
+    await insert_crawl_result(url, depth, None, None, page.title, body_text, seen_at, job_id,
+                              page.text_hash, duplicate_of)
+    await save_links(url, internal_links, external_links)
+    await save_url_state(url, result.etag, result.last_modified, content_hash, seen_at)
 
-    logger.info(f"Crawled: {url} (Depth: {depth})")
+    if duplicate_of is not None:
+        logger.info(f"Crawled: {url} (Depth: {depth}), near-duplicate of {duplicate_of}")
+        if NEAR_DUP_SKIP_LINKS:
+            return []
+    else:
+        logger.info(f"Crawled: {url} (Depth: {depth})")
     logger.info(f"Found {len(internal_links)} internal and {len(external_links)} external links")
 
     return internal_links
 
-async def crawl(base_url, max_depth, max_urls=MAX_URLS):
-    queue = [(base_url, 0)]
-    visited = set()
+class CrawlContext:
+    """State shared by the workers of one crawl."""
 
-    async with aiohttp.ClientSession() as session:
-        while queue and len(visited) < max_urls:
-            url, depth = queue.pop(0)
-            if url not in visited:
-                visited.add(url)
-                new_links = await crawl_page(url, base_url, depth, max_depth, session)
-                for link in new_links:
-                    if link not in visited:
-                        queue.append((link, depth + 1))
+    def __init__(self, base_url, max_depth, max_urls, session, job_id=None, progress=None, incremental=False,
+                 shared=False):
+        self.base_url = base_url
+        self.max_depth = max_depth
+        self.max_urls = max_urls
+        self.session = session
+        self.job_id = job_id
+        self.progress = progress
+        self.incremental = incremental
+        self.fingerprints = SimHashIndex(NEAR_DUP_DISTANCE) if NEAR_DUP_DISTANCE >= 0 else None
+        # Job frontiers are checkpointed so an interrupted job can resume;
+        # shared jobs lease their URLs from a frontier all workers use.
+        if job_id and shared:
+            self.frontier = LeasedFrontier(job_id, max_urls)
+        elif job_id:
+            self.frontier = CheckpointedFrontier(job_id)
+        else:
+            self.frontier = Frontier()
+        self.crawled = 0
+        self.stop = asyncio.Event()
+
+    def report(self):
+        if self.progress is not None:
+            self.progress(self.crawled, len(self.frontier))
+
+async def crawl_worker(ctx):
+    frontier = ctx.frontier
+    while True:
+        url, depth = await frontier.get()
+        busy_workers.inc()
+        try:
+            # Once the URL budget is spent, drain the frontier without fetching
+            # so frontier.join() returns as soon as in-flight pages finish.
+            if ctx.stop.is_set():
+                continue
+            ctx.crawled += 1
+            if ctx.crawled >= ctx.max_urls:
+                ctx.stop.set()
+
+            new_links = await crawl_page(url, ctx.base_url, depth, ctx.max_depth, ctx.session,
+                                         ctx.job_id, ctx.incremental, ctx.fingerprints)
+            if depth < ctx.max_depth:
+                for link in frontier.unseen(new_links):
+                    if await scheduler.allowed(link, ctx.session):
+                        frontier.add(link, depth + 1)
+            frontier.done(url)
+
+            logger.info(f"Progress: Crawled {ctx.crawled} URLs, {len(frontier)} queued")
+            ctx.report()
+        except Exception as e:
+            logger.error(f"Error crawling {url}: {str(e)}")
+            frontier.done(url)
+        finally:
+            busy_workers.dec()
+            frontier.task_done()
+
+async def checkpoint_periodically(frontier):
+    while True:
+        await asyncio.sleep(frontier.checkpoint_interval)
+        await frontier.checkpoint()
+
+async def crawl(base_url, max_depth, max_urls=MAX_URLS, workers=CRAWL_WORKERS, job_id=None, progress=None,
+                incremental=False, resume=False, shared=False):
+    """Crawl base_url breadth-first and return the number of pages visited.
+
+    progress, if given, is called as progress(pages_crawled, pages_queued)
+    after every page. With incremental, pages are fetched conditionally and
+    ones that have not changed since they were last stored only have their
+    last_seen time bumped. With resume, the job's frontier is restored from
+    its last checkpoint and pages it had already crawled are not fetched again.
+    A shared job can be crawled by several processes at once (see
+    LeasedFrontier); its page count covers all of them.
+    """
+    base_url = canonicalize_url(base_url) or base_url
+
+    async with await http_client.session() as session:
+        ctx = CrawlContext(base_url, max_depth, max_urls, session, job_id, progress, incremental, shared)
+        if resume and job_id:
+            # The job's last checkpoint may still be sitting in the writer queue.
+            await crawl_writer.flush()
+            ctx.crawled = await ctx.frontier.restore()
+            if ctx.crawled >= max_urls:
+                ctx.stop.set()
+        if await scheduler.allowed(base_url, session):
+            ctx.frontier.add(base_url, 0)
+        else:
+            logger.warning(f"{base_url} is disallowed by robots.txt")
 
-            logger.info(f"Progress: Crawled {len(visited)} URLs")
+        workers = max(1, workers)
+        tasks = [asyncio.create_task(crawl_worker(ctx)) for _ in range(workers)]
+        crawl_workers.inc(amount=workers)
+        if job_id:
+            tasks.append(asyncio.create_task(checkpoint_periodically(ctx.frontier)))
+        running_crawls.add(ctx)
+        try:
+            await ctx.frontier.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            running_crawls.discard(ctx)
+            crawl_workers.dec(amount=workers)
+            await ctx.frontier.close()
 
-    logger.info(f"Crawl completed. Visited {len(visited)} URLs.")
-    return len(visited)
\ No newline at end of file
+    await crawl_writer.flush()
+    pages = ctx.frontier.crawled if job_id and shared else ctx.crawled
+    logger.info(f"Crawl completed. Visited {pages} URLs.")
+    return pages
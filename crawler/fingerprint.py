@@ -0,0 +1,81 @@
+# fingerprint.py
+import hashlib
+from collections import Counter
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+# Pages with fewer words than this carry too little text to fingerprint;
+# every near-empty page would otherwise look like a duplicate of every other.
+MIN_TOKENS = 10
+# Four 16-bit bands: two simhashes within 3 bits of each other must agree on
+# at least one whole band, so band equality finds every candidate.
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+MAX_DISTANCE = BANDS - 1
+
+_MASKS = [1 << i for i in range(SIMHASH_BITS)]
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def simhash(text):
+    """64-bit SimHash over word shingles, or None if text is too short."""
+    tokens = text.lower().split()
+    if len(tokens) < MIN_TOKENS:
+        return None
+
+    features = Counter(' '.join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1))
+    weights = [0] * SIMHASH_BITS
+    for feature, count in features.items():
+        h = _feature_hash(feature)
+        for i, mask in enumerate(_MASKS):
+            weights[i] += count if h & mask else -count
+
+    value = 0
+    for i, weight in enumerate(weights):
+        if weight > 0:
+            value |= _MASKS[i]
+    return value
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+def bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+def to_signed(value):
+    """SQLite INTEGER is signed 64-bit."""
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+def from_signed(value):
+    return value + (1 << SIMHASH_BITS) if value < 0 else value
+
+class SimHashIndex:
+    """In-memory band index over the pages of one crawl."""
+
+    def __init__(self, distance):
+        self.distance = min(distance, MAX_DISTANCE)
+        self.exact = {}
+        self.buckets = {}
+
+    def find(self, content_hash, value):
+        if value is None:
+            return None
+        if content_hash in self.exact:
+            return self.exact[content_hash]
+        for key in enumerate(bands(value)):
+            for other, url in self.buckets.get(key, ()):
+                if hamming(value, other) <= self.distance:
+                    return url
+        return None
+
+    def add(self, content_hash, value, url):
+        if value is None:
+            return
+        self.exact.setdefault(content_hash, url)
+        for key in enumerate(bands(value)):
+            self.buckets.setdefault(key, []).append((value, url))
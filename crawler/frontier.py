@@ -0,0 +1,267 @@
+# frontier.py
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from urllib.parse import urlsplit, urlunsplit, unquote_plus
+from crawler.seen import make_seen_set, ScalableBloomFilter
+from database.db import (checkpoint_frontier, iter_frontier, count_frontier_done, load_frontier_seen, claim_frontier,
+                         renew_leases, release_leases)
+from database.writer import crawl_writer, WriteError
+from config import (TRACKING_PARAMS, FRONTIER_CHECKPOINT_INTERVAL, FRONTIER_LEASE_TTL, FRONTIER_LEASE_BATCH,
+                    FRONTIER_POLL_INTERVAL)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Seconds between saves of a Bloom-filter seen set, which can run to megabytes.
+SEEN_SAVE_INTERVAL = 60
+
+def canonicalize_url(url):
+    """Normalize a URL so trivially different spellings of a page compare equal.
+
+    Returns None for URLs the crawler cannot fetch (mailto:, javascript:, ...).
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    netloc = parts.hostname.lower()
+    if ':' in netloc:
+        netloc = f"[{netloc}]"
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+
+    path = parts.path or '/'
+    if len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+
+    # Pairs are kept as written, so a bare "?q" does not turn into "?q=".
+    query = sorted(
+        pair for pair in parts.query.split('&')
+        if pair and not _is_tracking_param(unquote_plus(pair.partition('=')[0]))
+    )
+
+    return urlunsplit((scheme, netloc, path, '&'.join(query), ''))
+
+def _is_tracking_param(name):
+    name = name.lower()
+    return any(name.startswith(p[:-1]) if p.endswith('*') else name == p for p in TRACKING_PARAMS)
+
+class Frontier:
+    """FIFO crawl frontier with an enqueue-time seen index.
+
+    URLs are canonicalized before the seen check, so every page is queued at
+    most once no matter how many times or how it is linked. asyncio.Queue is
+    backed by a deque, so put/get are O(1).
+    """
+
+    checkpoint_interval = FRONTIER_CHECKPOINT_INTERVAL
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.seen = make_seen_set()
+
+    def add(self, url, depth):
+        url = canonicalize_url(url)
+        if url is None or url in self.seen:
+            return False
+        self.seen.add(url)
+        self.queue.put_nowait((url, depth))
+        return True
+
+    def unseen(self, urls):
+        """Yield canonical forms of urls that have not been queued yet."""
+        batch = set()
+        for url in urls:
+            url = canonicalize_url(url)
+            if url is not None and url not in self.seen and url not in batch:
+                batch.add(url)
+                yield url
+
+    async def get(self):
+        return await self.queue.get()
+
+    def task_done(self):
+        self.queue.task_done()
+
+    async def join(self):
+        await self.queue.join()
+
+    def done(self, url):
+        """Record that url has been crawled; only checkpointed frontiers keep track."""
+
+    async def checkpoint(self):
+        pass
+
+    async def restore(self):
+        """Reload saved state; returns how many pages were already crawled."""
+        return 0
+
+    async def close(self):
+        await self.checkpoint()
+
+    def __len__(self):
+        return self.queue.qsize()
+
+class CheckpointedFrontier(Frontier):
+    """Frontier of a crawl job, checkpointed to the frontier table so the job can resume.
+
+    add() and done() only record changes in memory; checkpoint() hands
+    everything since the last checkpoint to the crawl writer as one batch.
+    A resumed job skips pages marked done and fetches the rest again,
+    including any that were in flight when the process stopped.
+
+    A Bloom-filter seen set is saved with a checkpoint every
+    SEEN_SAVE_INTERVAL seconds and on close. Restoring loads it and reads
+    back only the URLs still to crawl plus any queued after the save, so
+    resuming a huge job never holds every URL string at once.
+    """
+
+    persist_seen = True
+
+    def __init__(self, job_id):
+        super().__init__()
+        self.job_id = job_id
+        self.added = []
+        self.completed = []
+        self.seen_saved_at = time.monotonic()
+
+    def add(self, url, depth):
+        url = canonicalize_url(url)
+        if url is None or not super().add(url, depth):
+            return False
+        self.added.append((url, depth))
+        return True
+
+    def done(self, url):
+        self.completed.append(url)
+
+    async def checkpoint(self, save_seen=False):
+        added, self.added = self.added, []
+        completed, self.completed = self.completed, []
+        seen = None
+        if self.persist_seen and isinstance(self.seen, ScalableBloomFilter) and (
+                save_seen or time.monotonic() - self.seen_saved_at >= SEEN_SAVE_INTERVAL):
+            seen = self.seen.to_bytes()
+            self.seen_saved_at = time.monotonic()
+        if added or completed or seen is not None:
+            await checkpoint_frontier(self.job_id, added, completed, seen)
+
+    async def restore(self):
+        """Reload the last checkpoint; returns how many pages it had already crawled."""
+        saved = None
+        if isinstance(self.seen, ScalableBloomFilter):
+            saved = await load_frontier_seen(self.job_id)
+        since_id = None
+        crawled = 0
+        if saved is not None:
+            data, since_id = saved
+            self.seen = ScalableBloomFilter.from_bytes(data)
+            crawled = await count_frontier_done(self.job_id, since_id)
+        async for url, depth, done in iter_frontier(self.job_id, since_id):
+            self.seen.add(url)
+            if done:
+                crawled += 1
+            else:
+                self.queue.put_nowait((url, depth))
+        logger.info(f"Restored frontier of job {self.job_id}: {crawled} crawled, {len(self)} queued")
+        return crawled
+
+    async def close(self):
+        await self.checkpoint(save_seen=True)
+
+
+class LeasedFrontier(CheckpointedFrontier):
+    """Frontier of a shared job, which several processes crawl together.
+
+    The frontier table is the single source of truth: new URLs are inserted
+    there (its UNIQUE constraint is the shared seen-set) and workers lease
+    them in batches. Leases are renewed at every checkpoint while the worker
+    is alive; once a worker stops renewing, its URLs expire after lease_ttl
+    seconds and whoever claims next picks them up. The crawl is over when no
+    process has anything queued or leased.
+    """
+
+    # Other processes add URLs too, so this process's seen set is not the job's.
+    persist_seen = False
+
+    def __init__(self, job_id, max_urls, lease_ttl=FRONTIER_LEASE_TTL, batch_size=FRONTIER_LEASE_BATCH,
+                 poll_interval=FRONTIER_POLL_INTERVAL):
+        super().__init__(job_id)
+        self.max_urls = max_urls
+        self.lease_ttl = lease_ttl
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.checkpoint_interval = min(FRONTIER_CHECKPOINT_INTERVAL, lease_ttl / 3)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.crawled = 0
+        self.finished = asyncio.Event()
+        self.claim_lock = asyncio.Lock()
+
+    def add(self, url, depth):
+        # Other processes queue URLs too, so the local seen-set only saves
+        # re-inserting what this process has already seen.
+        url = canonicalize_url(url)
+        if url is None or url in self.seen:
+            return False
+        self.seen.add(url)
+        self.added.append((url, depth))
+        return True
+
+    async def get(self):
+        while self.queue.empty():
+            async with self.claim_lock:
+                if not self.queue.empty():
+                    break
+                if await self._claim():
+                    break
+            await asyncio.sleep(self.poll_interval)
+        return self.queue.get_nowait()
+
+    async def _claim(self):
+        # Make this process's new URLs and finished pages visible to everyone first.
+        await super().checkpoint()
+        try:
+            await crawl_writer.flush()
+        except WriteError as e:
+            # Pages whose done marks were lost keep their leases until they
+            # expire, and are then crawled again.
+            logger.error(f"Frontier checkpoint of job {self.job_id} was not saved: {str(e)}")
+        claimed, crawled, finished = await claim_frontier(self.job_id, self.owner, self.batch_size,
+                                                          self.max_urls, self.lease_ttl)
+        # The job's owner deletes the frontier once it completes; keep the last real count.
+        self.crawled = max(self.crawled, crawled)
+        for url, depth in claimed:
+            self.seen.add(url)
+            self.queue.put_nowait((url, depth))
+        if finished:
+            self.finished.set()
+        return bool(claimed)
+
+    async def join(self):
+        await self.finished.wait()
+
+    async def restore(self):
+        # Nothing to reload: whatever is left is claimed from the table as usual.
+        return 0
+
+    async def checkpoint(self):
+        await super().checkpoint()
+        await renew_leases(self.job_id, self.owner, self.lease_ttl)
+
+    async def close(self):
+        await super().checkpoint()
+        try:
+            await crawl_writer.flush()
+        finally:
+            await release_leases(self.job_id, self.owner)
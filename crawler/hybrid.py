@@ -0,0 +1,86 @@
+# hybrid.py
+import logging
+import re
+from urllib.parse import urlsplit
+from utils.helpers import TTLCache, MISSING
+from config import RENDER_DECISION_TTL, RENDER_FAILURE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# Pages with less visible text than this that still load scripts are
+# probably filled in by JavaScript.
+MIN_TEXT = 200
+DECISION_CACHE_SIZE = 10000
+
+SCRIPT_TAG = re.compile(rb'<script\b', re.I)
+# An empty mount point for a client-side framework: React, Vue, Next.js, Nuxt, Svelte, Angular.
+SPA_ROOT = re.compile(
+    rb'<(?:div|main)[^>]*\bid=["\']?(?:root|app|__next|__nuxt|svelte|app-root)["\']?[^>]*>\s*</(?:div|main)>'
+    rb'|<app-root[^>]*>\s*</app-root>', re.I)
+NOSCRIPT_HINT = re.compile(rb'<noscript[^>]*>[^<]{0,500}?(?:enable|requires?|turn on|need)\s+javascript', re.I)
+
+def render_reason(body, page):
+    """Why a statically fetched page looks like it needs JavaScript to render, or None."""
+    scripts = len(SCRIPT_TAG.findall(body))
+    if not scripts:
+        return None
+    if len(page.body_text) < MIN_TEXT:
+        return "almost no text without JavaScript"
+    if SPA_ROOT.search(body):
+        return "empty application root element"
+    if NOSCRIPT_HINT.search(body):
+        return "noscript asks for JavaScript"
+    if len(page.links) * 2 < scripts:
+        return f"{scripts} scripts but only {len(page.links)} links"
+    return None
+
+def url_pattern(url):
+    """Host plus first path segment, so pages built from one template share a decision.
+
+    A first segment containing digits (/2024, /p123) is treated as a wildcard.
+    """
+    parts = urlsplit(url)
+    segments = [segment for segment in parts.path.split('/') if segment]
+    first = segments[0] if segments else ''
+    if any(c.isdigit() for c in first):
+        first = '*'
+    return f"{parts.netloc}/{first}"
+
+class RenderDecisions:
+    """Remembers, per URL pattern, whether its pages needed rendering.
+
+    Pages of a pattern known to need it are rendered straight away, skipping
+    the static fetch. Everything else is fetched statically and checked.
+    After failure_limit failed renders in a row a pattern's decision is
+    dropped and its pages are not rendered at all until the TTL runs out,
+    so a missing or crashing browser degrades hybrid mode to static.
+    """
+
+    def __init__(self, ttl=RENDER_DECISION_TTL, maxsize=DECISION_CACHE_SIZE, failure_limit=RENDER_FAILURE_LIMIT):
+        self.cache = TTLCache(maxsize, ttl)
+        self.failures = TTLCache(maxsize, ttl)
+        self.failure_limit = failure_limit
+
+    def needs_render(self, url):
+        return self.cache.get(url_pattern(url)) is True and self.can_render(url)
+
+    def can_render(self, url):
+        failures = self.failures.get(url_pattern(url))
+        return failures is MISSING or failures < self.failure_limit
+
+    def record(self, url, render):
+        self.cache.set(url_pattern(url), render)
+
+    def record_render(self, url, ok):
+        pattern = url_pattern(url)
+        if ok:
+            self.failures.pop(pattern)
+            return
+        failures = self.failures.get(pattern)
+        failures = 1 if failures is MISSING else failures + 1
+        self.failures.set(pattern, failures)
+        if failures == self.failure_limit:
+            logger.warning(f"{failures} renders of {pattern} failed, fetching its pages statically")
+            self.cache.pop(pattern)
+
+render_decisions = RenderDecisions()
@@ -0,0 +1,207 @@
+# jobs.py
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime
+from crawler.crawler import crawl
+from database.db import (insert_job, update_job, get_job, interrupt_unfinished_jobs, delete_frontier, renew_jobs,
+                         claim_job, start_job, finish_job, cancel_job)
+from config import (MAX_CONCURRENT_JOBS, MAX_PENDING_JOBS, JOB_PROGRESS_INTERVAL, RESUME_INTERRUPTED_JOBS,
+                    JOB_HEARTBEAT_TTL)
+
+logger = logging.getLogger(__name__)
+
+RESUMABLE = ('failed', 'cancelled', 'interrupted')
+
+class JobLimitError(Exception):
+    pass
+
+class CrawlJob:
+    def __init__(self, job_id, license_key, url, max_depth, max_urls, incremental=False, shared=False):
+        self.id = job_id
+        self.license_key = license_key
+        self.url = url
+        self.max_depth = max_depth
+        self.max_urls = max_urls
+        self.incremental = incremental
+        self.shared = shared
+        self.resume = False
+        # Set when another process cancelled or took over the job.
+        self.remote_stop = False
+        self.status = 'queued'
+        self.pages_crawled = 0
+        self.pages_queued = 0
+        self.task = None
+
+    def progress(self, pages_crawled, pages_queued):
+        self.pages_crawled = pages_crawled
+        self.pages_queued = pages_queued
+
+class JobManager:
+    """Runs crawls as background jobs, at most max_concurrent at a time.
+
+    Job rows live in crawl_jobs so status outlives the process; progress
+    counts are written there every JOB_PROGRESS_INTERVAL seconds while a job
+    runs and served from memory in between.
+
+    Several processes may share the database, so every job records its
+    owner, and the owner renews a heartbeat on its jobs every
+    heartbeat_ttl / 3 seconds. Only jobs whose heartbeat has expired are
+    taken for interrupted. The heartbeat also tells the owner which of its
+    jobs were cancelled through another process, and it stops them.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_JOBS, max_pending=MAX_PENDING_JOBS,
+                 heartbeat_ttl=JOB_HEARTBEAT_TTL):
+        self.max_pending = max_pending
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self.heartbeat_ttl = heartbeat_ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs = {}
+        self.closing = False
+        self.heartbeat = None
+        self.resume_interrupted = RESUME_INTERRUPTED_JOBS
+
+    async def start(self, resume_interrupted=RESUME_INTERRUPTED_JOBS):
+        self.resume_interrupted = resume_interrupted
+        await self._interrupt_expired()
+        if self.heartbeat is None:
+            self.heartbeat = asyncio.create_task(self._beat())
+
+    async def _interrupt_expired(self):
+        interrupted = await interrupt_unfinished_jobs(datetime.now().isoformat(), self.heartbeat_ttl)
+        if not interrupted:
+            return
+        if not self.resume_interrupted:
+            logger.warning(f"Marked {len(interrupted)} abandoned crawl jobs as interrupted")
+            return
+        for job_id in interrupted:
+            try:
+                await self.resume(job_id)
+            except JobLimitError as e:
+                logger.warning(f"Could not resume crawl job {job_id}: {str(e)}")
+
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_ttl / 3)
+            try:
+                # Snapshot first: jobs added while renewing are not in owned yet.
+                jobs = list(self.jobs.values())
+                owned = await renew_jobs(self.owner)
+                for job in jobs:
+                    # Cancelled, or taken over after a missed heartbeat, by another process.
+                    if job.status in ('queued', 'running') and job.id not in owned:
+                        logger.info(f"Crawl job {job.id} was stopped by another process")
+                        job.remote_stop = True
+                        job.task.cancel()
+                await self._interrupt_expired()
+            except Exception as e:
+                logger.warning(f"Crawl job heartbeat failed: {str(e)}")
+
+    async def close(self):
+        self.closing = True
+        if self.heartbeat is not None:
+            self.heartbeat.cancel()
+            self.heartbeat = None
+        jobs = [job for job in self.jobs.values() if job.task and not job.task.done()]
+        for job in jobs:
+            job.task.cancel()
+        await asyncio.gather(*(job.task for job in jobs), return_exceptions=True)
+
+    async def submit(self, license_key, url, max_depth, max_urls, incremental=False, shared=False):
+        if len(self.jobs) >= self.max_pending:
+            raise JobLimitError(f"Too many pending crawl jobs (limit {self.max_pending})")
+
+        job = CrawlJob(uuid.uuid4().hex, license_key, url, max_depth, max_urls, incremental, shared)
+        await insert_job(job.id, license_key, url, max_depth, max_urls, incremental, job.status,
+                         datetime.now().isoformat(), shared, self.owner)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job))
+        logger.info(f"Queued crawl job {job.id} for {url}")
+        return job.id
+
+    async def resume(self, job_id):
+        """Restart a stopped job from its last frontier checkpoint; False if it cannot be resumed."""
+        if job_id in self.jobs:
+            return False
+        if len(self.jobs) >= self.max_pending:
+            raise JobLimitError(f"Too many pending crawl jobs (limit {self.max_pending})")
+        # Claimed in one statement, so two processes cannot both resume it.
+        row = await claim_job(job_id, self.owner, RESUMABLE)
+        if row is None:
+            return False
+
+        job = CrawlJob(job_id, row['license_key'], row['url'], row['max_depth'], row['max_urls'],
+                       bool(row['incremental']), bool(row['shared']))
+        job.resume = True
+        self.jobs[job_id] = job
+        job.task = asyncio.create_task(self._run(job))
+        logger.info(f"Resuming crawl job {job_id} for {job.url}")
+        return True
+
+    async def status(self, job_id, db=None):
+        row = await get_job(job_id, db)
+        if row is None:
+            return None
+        job = self.jobs.get(job_id)
+        if job is not None:
+            row.update(status=job.status, pages_crawled=job.pages_crawled, pages_queued=job.pages_queued)
+        return row
+
+    async def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.task.cancel()
+            return True
+        # Running in another process, which stops it at its next heartbeat.
+        return await cancel_job(job_id, datetime.now().isoformat())
+
+    async def _run(self, job):
+        ticker = None
+        try:
+            async with self.slots:
+                if not await start_job(job.id, self.owner, datetime.now().isoformat()):
+                    logger.info(f"Crawl job {job.id} was stopped by another process before it started")
+                    return
+                job.status = 'running'
+                ticker = asyncio.create_task(self._save_progress(job))
+                pages = await crawl(job.url, job.max_depth, job.max_urls, job_id=job.id,
+                                    progress=job.progress, incremental=job.incremental, resume=job.resume,
+                                    shared=job.shared)
+                job.status = 'completed'
+                job.pages_crawled = pages
+                job.pages_queued = 0
+                await self._finish(job)
+                if job.status == 'completed':
+                    await delete_frontier(job.id)
+                logger.info(f"Crawl job {job.id} {job.status}: {pages} URLs")
+        except asyncio.CancelledError:
+            job.status = 'interrupted' if self.closing and not job.remote_stop else 'cancelled'
+            await self._finish(job)
+            logger.info(f"Crawl job {job.id} {job.status}")
+        except Exception as e:
+            job.status = 'failed'
+            await self._finish(job, error=str(e))
+            logger.error(f"Crawl job {job.id} failed: {str(e)}")
+        finally:
+            if ticker is not None:
+                ticker.cancel()
+            self.jobs.pop(job.id, None)
+
+    async def _finish(self, job, error=None):
+        status = await finish_job(job.id, self.owner, job.status, job.pages_crawled, job.pages_queued, error,
+                                  datetime.now().isoformat())
+        if status is not None:
+            job.status = status
+
+    async def _save_progress(self, job):
+        while True:
+            await asyncio.sleep(JOB_PROGRESS_INTERVAL)
+            try:
+                await update_job(job.id, pages_crawled=job.pages_crawled, pages_queued=job.pages_queued)
+            except Exception as e:
+                logger.warning(f"Could not save progress for crawl job {job.id}: {str(e)}")
+
+job_manager = JobManager()
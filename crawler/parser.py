@@ -0,0 +1,199 @@
+# parser.py
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from crawler.fingerprint import text_hash, simhash
+from utils.metrics import parse_seconds
+from config import HTML_PARSER, PARSE_WORKERS, PARSE_MAX_PENDING, PARSE_INLINE_MAX_BYTES
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - lxml is optional
+    etree = None
+
+logger = logging.getLogger(__name__)
+
+# Text inside these tags is not page text, matching BeautifulSoup's get_text().
+SKIP_TEXT_TAGS = frozenset(('script', 'style', 'template'))
+
+class ParsedPage:
+    __slots__ = ('links', 'title', 'body_text', 'text_hash', 'simhash')
+
+    def __init__(self, links, title, body_text, text_hash=None, simhash=None):
+        self.links = links
+        self.title = title
+        self.body_text = body_text
+        self.text_hash = text_hash
+        self.simhash = simhash
+
+def normalize_text(parts):
+    return ' '.join(' '.join(parts).split())
+
+def parse_with_bs4(content, url):
+    soup = BeautifulSoup(content, 'html.parser')
+    links = [urljoin(url, a_tag['href']) for a_tag in soup.find_all('a', href=True)]
+    body_text = soup.body.get_text(separator=' ', strip=True) if soup.body else ''
+    # str() so callers do not keep the whole soup alive via the NavigableString.
+    title = str(soup.title.string) if soup.title and soup.title.string else None
+    return ParsedPage(links, title, normalize_text([body_text]))
+
+class _PageTarget:
+    """lxml parser target that collects links, title and body text as events arrive."""
+
+    def __init__(self):
+        self.hrefs = []
+        self.title_parts = None
+        self.text_parts = []
+        # lxml splits one text node over several data() calls (at entity
+        # references and input buffer boundaries); pieces are collected here
+        # and only become a separate part at a tag or comment, as in bs4.
+        self.text_buffer = []
+        self.in_title = False
+        self.in_body = False
+        self.skip_depth = 0
+
+    def flush_text(self):
+        if self.text_buffer:
+            self.text_parts.append(''.join(self.text_buffer))
+            self.text_buffer = []
+
+    def start(self, tag, attrib):
+        self.flush_text()
+        if tag == 'a':
+            href = attrib.get('href')
+            if href is not None:
+                self.hrefs.append(href)
+        elif tag in SKIP_TEXT_TAGS:
+            self.skip_depth += 1
+        elif tag == 'body':
+            self.in_body = True
+        elif tag == 'title' and self.title_parts is None:
+            self.in_title = True
+            self.title_parts = []
+
+    def end(self, tag):
+        self.flush_text()
+        if tag in SKIP_TEXT_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag == 'title':
+            self.in_title = False
+        elif tag == 'body':
+            self.in_body = False
+
+    def data(self, text):
+        if self.in_title:
+            self.title_parts.append(text)
+        elif self.in_body and not self.skip_depth:
+            self.text_buffer.append(text)
+
+    def comment(self, text):
+        self.flush_text()
+
+    def close(self):
+        self.flush_text()
+        return self
+
+def parse_with_lxml(content, url):
+    """Same result as parse_with_bs4, except for markup without a <body> tag:
+    libxml2 implies one around the text, so such pages keep their text here
+    where bs4 returns ''.
+    """
+    target = _PageTarget()
+    parser = etree.HTMLParser(target=target, recover=True)
+    parser.feed(content)
+    parser.close()
+
+    title = ''.join(target.title_parts) if target.title_parts else None
+    links = [urljoin(url, href) for href in target.hrefs]
+    return ParsedPage(links, title, normalize_text(target.text_parts))
+
+PARSERS = {'bs4': parse_with_bs4}
+if etree is not None:
+    PARSERS['lxml'] = parse_with_lxml
+
+def get_parser(name=HTML_PARSER):
+    parser = PARSERS.get(name)
+    if parser is None:
+        logger.warning(f"HTML parser '{name}' is not available, falling back to bs4")
+        parser = parse_with_bs4
+    return parser
+
+default_parser = get_parser()
+
+def parse_html(content, url, parser=None):
+    """Extract links (absolute), title and whitespace-normalized body text."""
+    return (parser or default_parser)(content, url)
+
+def decode_body(body, encoding):
+    try:
+        return body.decode(encoding or 'utf-8', errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+def parse_document(body, encoding, url, parser_name=HTML_PARSER):
+    """Parse and fingerprint raw response bytes.
+
+    Returns a plain (links, title, body_text, text_hash, simhash) tuple.
+    This is what runs in the parse pool, so it takes and returns only
+    cheap-to-pickle values.
+    """
+    page = get_parser(parser_name)(decode_body(body, encoding), url)
+    return page.links, page.title, page.body_text, text_hash(page.body_text), simhash(page.body_text)
+
+class ParsePool:
+    """Runs parse_document in worker processes so parsing never blocks the event loop.
+
+    At most max_pending documents are handed to the pool at once; beyond
+    that parse() waits, which in turn holds back the crawl workers. Bodies up
+    to inline_max_bytes are cheaper to parse in place than to ship to
+    another process, and so are parsed inline. workers=0 parses everything
+    inline.
+    """
+
+    def __init__(self, workers=PARSE_WORKERS, max_pending=PARSE_MAX_PENDING,
+                 inline_max_bytes=PARSE_INLINE_MAX_BYTES):
+        self.workers = workers
+        self.inline_max_bytes = inline_max_bytes
+        self.pending = asyncio.Semaphore(max(1, max_pending))
+        self.executor = None
+
+    def _get_executor(self):
+        if self.executor is None:
+            # spawn, not fork: the parent runs aiosqlite and executor threads.
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            logger.info(f"Parse pool started with {self.workers} processes")
+        return self.executor
+
+    async def parse(self, body, encoding, url):
+        started = time.perf_counter()
+        try:
+            return await self._parse(body, encoding, url)
+        finally:
+            parse_seconds.observe(time.perf_counter() - started)
+
+    async def _parse(self, body, encoding, url):
+        if self.workers <= 0 or len(body) <= self.inline_max_bytes:
+            return ParsedPage(*parse_document(body, encoding, url))
+
+        async with self.pending:
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(self._get_executor(), parse_document,
+                                                    body, encoding, url, HTML_PARSER)
+            except BrokenProcessPool:
+                logger.error(f"Parse pool crashed while parsing {url}, restarting it")
+                self.close()
+                result = parse_document(body, encoding, url)
+        return ParsedPage(*result)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+parse_pool = ParsePool()
@@ -0,0 +1,129 @@
+# politeness.py
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+from config import USER_AGENT, HOST_RATE, HOST_BURST, ROBOTS_TTL, RESPECT_ROBOTS, CRAWLER_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def set_rate(self, rate):
+        self.rate = rate
+        self.burst = min(self.burst, max(1, rate))
+        self.tokens = min(self.tokens, self.burst)
+
+    async def acquire(self):
+        # Waiters for the same host queue up on the lock, so sleeping while
+        # holding it is what spaces their requests out.
+        async with self.lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1
+                self.updated = time.monotonic()
+            self.tokens -= 1
+
+    def block_for(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+class RobotsCache:
+    def __init__(self, ttl=ROBOTS_TTL, user_agent=USER_AGENT):
+        self.ttl = ttl
+        self.user_agent = user_agent
+        self.entries = {}
+        self.pending = {}
+
+    async def get(self, origin, session):
+        entry = self.entries.get(origin)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+
+        # Share one fetch between every worker that misses on the same host.
+        if origin not in self.pending:
+            self.pending[origin] = asyncio.ensure_future(self._fetch(origin, session))
+        try:
+            parser = await asyncio.shield(self.pending[origin])
+        finally:
+            self.pending.pop(origin, None)
+
+        self.entries[origin] = (time.monotonic() + self.ttl, parser)
+        return parser
+
+    async def _fetch(self, origin, session):
+        parser = RobotFileParser(f"{origin}/robots.txt")
+        try:
+            async with session.get(parser.url, timeout=CRAWLER_TIMEOUT,
+                                   headers={'User-Agent': self.user_agent}) as response:
+                if response.status in (401, 403):
+                    parser.disallow_all = True
+                elif response.status >= 400:
+                    parser.allow_all = True
+                else:
+                    parser.parse((await response.text()).splitlines())
+        except Exception as e:
+            logger.warning(f"Could not fetch {parser.url}: {str(e)}")
+            parser.allow_all = True
+        parser.modified()
+        return parser
+
+class HostScheduler:
+    """Per-host request pacing plus robots.txt rules.
+
+    Each netloc gets a token bucket refilled at HOST_RATE requests per
+    second, slowed further to the host's Crawl-delay when robots.txt sets
+    one.
+    """
+
+    def __init__(self, rate=HOST_RATE, burst=HOST_BURST, respect_robots=RESPECT_ROBOTS):
+        self.rate = rate
+        self.burst = burst
+        self.respect_robots = respect_robots
+        self.robots = RobotsCache()
+        self.buckets = {}
+
+    def _bucket(self, netloc):
+        bucket = self.buckets.get(netloc)
+        if bucket is None:
+            bucket = self.buckets[netloc] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def allowed(self, url, session):
+        if not self.respect_robots:
+            return True
+        parts = urlsplit(url)
+        parser = await self.robots.get(f"{parts.scheme}://{parts.netloc}", session)
+
+        delay = parser.crawl_delay(self.robots.user_agent)
+        if delay:
+            bucket = self._bucket(parts.netloc)
+            rate = min(self.rate, 1 / float(delay))
+            if bucket.rate != rate:
+                bucket.set_rate(rate)
+
+        return parser.can_fetch(self.robots.user_agent, url)
+
+    async def wait(self, url):
+        await self._bucket(urlsplit(url).netloc).acquire()
+
+    def backoff(self, url, retry_after=None):
+        try:
+            seconds = float(retry_after)
+        except (TypeError, ValueError):
+            seconds = max(1.0, 1 / self.rate)
+        logger.warning(f"Backing off {urlsplit(url).netloc} for {seconds:.1f}s")
+        self._bucket(urlsplit(url).netloc).block_for(seconds)
@@ -0,0 +1,185 @@
+# render.py
+import asyncio
+import logging
+from urllib.parse import urlsplit
+from config import (USER_AGENT, RENDER_BROWSERS, RENDER_CONCURRENCY, RENDER_PAGES_PER_BROWSER, RENDER_TIMEOUT,
+                    RENDER_BLOCK_TYPES, RENDER_BLOCK_DOMAINS, RENDER_WAIT, RENDER_WAIT_TIMEOUT)
+
+try:
+    from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+except ImportError:  # pragma: no cover - playwright is optional
+    async_playwright = None
+    PlaywrightTimeoutError = None
+
+logger = logging.getLogger(__name__)
+
+class RenderResult:
+    """Status and headers of the main document, and the rendered HTML if it loaded."""
+
+    __slots__ = ('status', 'headers', 'html')
+
+    def __init__(self, status, headers, html):
+        self.status = status
+        self.headers = headers
+        self.html = html
+
+class RenderProfile:
+    """What a render downloads and how long it waits before reading the page.
+
+    Requests for block_types resources (Playwright resource types such as
+    image, font or media) and for hosts in or under block_domains are
+    aborted; the document itself never is. wait is 'load',
+    'domcontentloaded', 'networkidle' (navigation waits for the DOM, then up
+    to wait_timeout seconds for the network to go quiet) or
+    'selector:<css>' (up to wait_timeout seconds for a matching element).
+    A wait that runs out still returns whatever has rendered by then.
+    """
+
+    def __init__(self, block_types=RENDER_BLOCK_TYPES, block_domains=RENDER_BLOCK_DOMAINS, wait=RENDER_WAIT,
+                 wait_timeout=RENDER_WAIT_TIMEOUT):
+        self.block_types = frozenset(t.strip() for t in block_types if t.strip())
+        self.block_domains = tuple(d.strip().lower() for d in block_domains if d.strip())
+        self.wait = wait
+        self.wait_timeout = wait_timeout
+        if wait.startswith('selector:'):
+            self.selector = wait[len('selector:'):]
+        elif wait in ('load', 'domcontentloaded', 'networkidle'):
+            self.selector = None
+        else:
+            raise ValueError(f"Unknown render wait strategy: {wait}")
+
+    @property
+    def blocks(self):
+        return bool(self.block_types or self.block_domains)
+
+    def blocked(self, resource_type, url):
+        if resource_type == 'document':
+            return False
+        if resource_type in self.block_types:
+            return True
+        host = (urlsplit(url).hostname or '').lower()
+        return any(host == domain or host.endswith('.' + domain) for domain in self.block_domains)
+
+    @property
+    def navigation_wait(self):
+        return self.wait if self.wait in ('load', 'domcontentloaded') else 'domcontentloaded'
+
+    async def settle(self, page):
+        try:
+            if self.selector is not None:
+                await page.wait_for_selector(self.selector, timeout=self.wait_timeout * 1000)
+            elif self.wait == 'networkidle':
+                await page.wait_for_load_state('networkidle', timeout=self.wait_timeout * 1000)
+        except PlaywrightTimeoutError:
+            logger.debug(f"Gave up waiting for {self.wait} on {page.url}")
+
+class _Browser:
+    def __init__(self, browser):
+        self.browser = browser
+        self.renders = 0
+        self.active = 0
+        self.retired = False
+
+class BrowserPool:
+    """Long-lived headless Chromium instances that render pages for the crawler.
+
+    Launching a browser takes seconds; a fresh context on a running one
+    takes milliseconds. So browsers are launched on first use and kept, and
+    each render gets its own context, which keeps cookies and storage from
+    leaking between pages. A browser is replaced after pages_per_browser
+    renders, to bound its memory growth, or as soon as it is found
+    disconnected. At most max_renders pages render at once.
+    """
+
+    def __init__(self, browsers=RENDER_BROWSERS, max_renders=RENDER_CONCURRENCY,
+                 pages_per_browser=RENDER_PAGES_PER_BROWSER, timeout=RENDER_TIMEOUT, profile=None):
+        self.profile = profile or RenderProfile()
+        self.slots = [None] * max(1, browsers)
+        self.renders = asyncio.Semaphore(max(1, max_renders))
+        self.pages_per_browser = pages_per_browser
+        self.timeout = timeout
+        self.lock = asyncio.Lock()
+        self.playwright = None
+
+    async def _launch(self):
+        if self.playwright is None:
+            if async_playwright is None:
+                raise RuntimeError("Rendering needs playwright: pip install playwright && playwright install chromium")
+            self.playwright = await async_playwright().start()
+        browser = await self.playwright.chromium.launch(headless=True)
+        logger.info("Launched a headless browser for rendering")
+        return _Browser(browser)
+
+    async def _close_browser(self, slot):
+        try:
+            await slot.browser.close()
+        except Exception as e:
+            logger.warning(f"Error closing browser: {str(e)}")
+
+    async def _acquire(self):
+        async with self.lock:
+            i = min(range(len(self.slots)), key=lambda i: self.slots[i].active if self.slots[i] else 0)
+            slot = self.slots[i]
+            if slot is None or not slot.browser.is_connected() or slot.renders >= self.pages_per_browser:
+                if slot is not None:
+                    if not slot.browser.is_connected():
+                        logger.warning("Browser disconnected, launching a replacement")
+                    slot.retired = True
+                    if slot.active == 0:
+                        await self._close_browser(slot)
+                slot = self.slots[i] = await self._launch()
+            slot.active += 1
+            slot.renders += 1
+            return slot
+
+    async def _release(self, slot):
+        slot.active -= 1
+        if slot.retired and slot.active == 0:
+            await self._close_browser(slot)
+
+    async def render(self, url, headers=None):
+        """Load url in a browser and return its status and rendered HTML."""
+        async with self.renders:
+            slot = await self._acquire()
+            try:
+                # Service workers would fetch past the route handler.
+                context = await slot.browser.new_context(user_agent=USER_AGENT, service_workers='block')
+                try:
+                    if self.profile.blocks or headers:
+                        async def handle(route, request):
+                            await self._route(route, request, headers)
+                        await context.route('**/*', handle)
+                    page = await context.new_page()
+                    response = await page.goto(url, timeout=self.timeout * 1000,
+                                               wait_until=self.profile.navigation_wait)
+                    await self.profile.settle(page)
+                    if response is None:
+                        return RenderResult(200, {}, await page.content())
+                    html = await page.content() if response.ok else None
+                    return RenderResult(response.status, response.headers, html)
+                finally:
+                    await context.close()
+            finally:
+                await self._release(slot)
+
+    async def _route(self, route, request, headers=None):
+        if self.profile.blocked(request.resource_type, request.url):
+            await route.abort()
+        elif headers and request.is_navigation_request() and request.frame.parent_frame is None:
+            # Conditional headers belong to the page only: a 304 for a script
+            # would leave it missing, as a fresh context has nothing cached.
+            await route.continue_(headers={**request.headers, **headers})
+        else:
+            await route.continue_()
+
+    async def close(self):
+        async with self.lock:
+            for i, slot in enumerate(self.slots):
+                if slot is not None:
+                    await self._close_browser(slot)
+                    self.slots[i] = None
+            if self.playwright is not None:
+                await self.playwright.stop()
+                self.playwright = None
+
+browser_pool = BrowserPool()
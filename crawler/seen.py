@@ -0,0 +1,130 @@
+# seen.py
+import hashlib
+import math
+import struct
+from config import SEEN_SET, BLOOM_CAPACITY, BLOOM_ERROR_RATE
+
+MAGIC = b'QSBF'
+# Each filter added to a ScalableBloomFilter holds twice as many items as the
+# last, at half its false-positive rate, so the rates sum to at most error_rate.
+GROWTH = 2
+TIGHTENING = 0.5
+
+def _hashes(item):
+    digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for capacity items at error_rate false positives."""
+
+    def __init__(self, capacity, error_rate, bits=None, count=0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+        self.count = count
+
+    def _positions(self, hashes):
+        h1, h2 = hashes
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hash_count)]
+
+    def has(self, hashes):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(hashes))
+
+    def put(self, hashes):
+        bits = self.bits
+        for p in self._positions(hashes):
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return self.has(_hashes(item))
+
+    def add(self, item):
+        self.put(_hashes(item))
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+class ScalableBloomFilter:
+    """Set-like membership test for strings in about 2 bytes per item at a 0.1% error rate.
+
+    A Bloom filter never forgets an item, but may report one it was never
+    given, with probability at most error_rate; for a crawl that means a few
+    URLs are wrongly skipped. When the current filter fills up a larger one
+    is added, so capacity is only a starting size. to_bytes()/from_bytes()
+    serialize the filter so it can be written to disk and loaded back.
+    """
+
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        self.initial_capacity = capacity
+        self.error_rate = error_rate
+        self.filters = []
+
+    def _grow(self):
+        i = len(self.filters)
+        error_rate = self.error_rate * (1 - TIGHTENING) * TIGHTENING ** i
+        self.filters.append(BloomFilter(self.initial_capacity * GROWTH ** i, error_rate))
+
+    def __contains__(self, item):
+        hashes = _hashes(item)
+        return any(f.has(hashes) for f in self.filters)
+
+    def add(self, item):
+        hashes = _hashes(item)
+        if any(f.has(hashes) for f in self.filters):
+            return
+        if not self.filters or self.filters[-1].full:
+            self._grow()
+        self.filters[-1].put(hashes)
+
+    def __len__(self):
+        return sum(f.count for f in self.filters)
+
+    @property
+    def nbytes(self):
+        return sum(len(f.bits) for f in self.filters)
+
+    def to_bytes(self):
+        parts = [MAGIC, struct.pack('<QdI', self.initial_capacity, self.error_rate, len(self.filters))]
+        for f in self.filters:
+            parts.append(struct.pack('<QdQQ', f.capacity, f.error_rate, f.count, len(f.bits)))
+            parts.append(bytes(f.bits))
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:4] != MAGIC:
+            raise ValueError("Not a serialized ScalableBloomFilter")
+        offset = 4
+        capacity, error_rate, filter_count = struct.unpack_from('<QdI', data, offset)
+        offset += struct.calcsize('<QdI')
+        bloom = cls(capacity, error_rate)
+        for _ in range(filter_count):
+            f_capacity, f_error_rate, count, length = struct.unpack_from('<QdQQ', data, offset)
+            offset += struct.calcsize('<QdQQ')
+            bits = bytearray(data[offset:offset + length])
+            offset += length
+            bloom.filters.append(BloomFilter(f_capacity, f_error_rate, bits, count))
+        return bloom
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+SEEN_SETS = {'exact': set, 'bloom': ScalableBloomFilter}
+
+def make_seen_set(kind=SEEN_SET):
+    """The set a frontier uses to remember queued URLs: an exact set, or a compact Bloom filter."""
+    if kind not in SEEN_SETS:
+        raise ValueError(f"Unknown seen set: {kind}")
+    return SEEN_SETS[kind]()
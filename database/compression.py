@@ -0,0 +1,89 @@
+# compression.py
+import logging
+import zlib
+from config import COMPRESSION, COMPRESSION_LEVEL, COMPRESSION_DICT
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ZLIB = 1
+ZSTD = 2
+CODECS = {'zlib': ZLIB, 'zstd': ZSTD}
+# Strings shorter than this grow rather than shrink when compressed.
+MIN_SIZE = 64
+
+class Codec:
+    """Compresses TEXT columns into self-describing BLOBs.
+
+    A compressed value is one codec byte, the CRC32 of the dictionary it was
+    compressed with (0 for none), then the payload. Plain str values, such
+    as rows written before compression was enabled, pass through decompress()
+    unchanged.
+    """
+
+    def __init__(self, name=COMPRESSION, level=COMPRESSION_LEVEL, dict_path=COMPRESSION_DICT):
+        if name == 'auto':
+            name = 'zstd' if zstandard is not None else 'zlib'
+        if name == 'zstd' and zstandard is None:
+            logger.warning("zstandard is not installed, compressing with zlib instead")
+            name = 'zlib'
+        if name not in CODECS and name != 'none':
+            raise ValueError(f"Unknown compression codec: {name}")
+        self.name = name
+        self.level = level
+
+        self.dictionary = b''
+        if dict_path:
+            with open(dict_path, 'rb') as f:
+                self.dictionary = f.read()
+        self.dict_id = zlib.crc32(self.dictionary) if self.dictionary else 0
+
+        self.zstd_dict = None
+        if zstandard is not None and self.dictionary:
+            self.zstd_dict = zstandard.ZstdCompressionDict(self.dictionary)
+
+    def _zstd_compressor(self):
+        level = self.level if self.level is not None else 3
+        return zstandard.ZstdCompressor(level=level, dict_data=self.zstd_dict)
+
+    def compress(self, text):
+        if text is None or self.name == 'none' or len(text) < MIN_SIZE:
+            return text
+        data = text.encode('utf-8')
+        if self.name == 'zstd':
+            payload = self._zstd_compressor().compress(data)
+        else:
+            level = self.level if self.level is not None else 6
+            if self.dictionary:
+                compressor = zlib.compressobj(level, zdict=self.dictionary)
+                payload = compressor.compress(data) + compressor.flush()
+            else:
+                payload = zlib.compress(data, level)
+        return bytes([CODECS[self.name]]) + self.dict_id.to_bytes(4, 'big') + payload
+
+    def decompress(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        codec, dict_id, payload = value[0], int.from_bytes(value[1:5], 'big'), value[5:]
+        if dict_id and dict_id != self.dict_id:
+            raise ValueError(f"Value was compressed with dictionary {dict_id:#010x}, which is not loaded")
+
+        if codec == ZSTD:
+            if zstandard is None:
+                raise RuntimeError("Value is zstd-compressed but zstandard is not installed")
+            decompressor = zstandard.ZstdDecompressor(dict_data=self.zstd_dict if dict_id else None)
+            data = decompressor.decompress(payload)
+        elif codec == ZLIB:
+            decompressor = zlib.decompressobj(zdict=self.dictionary) if dict_id else zlib.decompressobj()
+            data = decompressor.decompress(payload) + decompressor.flush()
+        else:
+            raise ValueError(f"Unknown compression codec byte: {codec}")
+        return data.decode('utf-8')
+
+codec = Codec()
+compress_text = codec.compress
+decompress_text = codec.decompress
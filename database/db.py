@@ -1,12 +1,36 @@
 # db.py
+import base64
+import json
+import sqlite3
+import time
 import aiosqlite
-from config import DB_NAME
+from config import DB_NAME, EXPORT_CHUNK_SIZE
+from database.pool import db_pool, register_functions
+from database.writer import crawl_writer
+from database.compression import compress_text, decompress_text
+from crawler.fingerprint import bands, hamming, to_signed, from_signed
 import logging
 
 logger = logging.getLogger(__name__)
 
+EXPORT_FIELDS = ('id', 'url', 'depth', 'title', 'body_text', 'internal_links',
+                 'external_links', 'crawled_at', 'job_id')
+# Stored compressed; see database/compression.py.
+COMPRESSED_FIELDS = ('body_text', 'internal_links', 'external_links')
+# Legacy JSON columns; new rows keep their links in the urls/edges graph.
+LINK_FIELDS = ('internal_links', 'external_links')
+JOB_FIELDS = ('status', 'pages_crawled', 'pages_queued', 'error', 'started_at', 'finished_at')
+
+async def add_column(db, table, column, definition):
+    """ALTER TABLE ... ADD COLUMN unless an older database already has it."""
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        columns = [row[1] for row in await cursor.fetchall()]
+    if column not in columns:
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
 async def init_db():
     async with aiosqlite.connect(DB_NAME) as db:
+        await register_functions(db)
         await db.execute("""
             CREATE TABLE IF NOT EXISTS crawls (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -16,11 +40,59 @@ async def init_db():
                 external_links TEXT,
                 title TEXT,
                 body_text TEXT,
-                crawled_at TIMESTAMP
+                crawled_at TIMESTAMP,
+                job_id TEXT,
+                content_hash TEXT,
+                duplicate_of TEXT
             )
         """)
+        await add_column(db, 'crawls', 'job_id', 'TEXT')
+        await add_column(db, 'crawls', 'content_hash', 'TEXT')
+        await add_column(db, 'crawls', 'duplicate_of', 'TEXT')
         await db.execute("CREATE INDEX IF NOT EXISTS idx_crawls_url ON crawls(url)")
-        await db.execute("CREATE INDEX IF NOT EXISTS idx_crawls_crawled_at ON crawls(crawled_at)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_crawls_job_id ON crawls(job_id, id)")
+        # (crawled_at, id) backs keyset pagination in get_results and supersedes
+        # the old single-column index.
+        await db.execute("DROP INDEX IF EXISTS idx_crawls_crawled_at")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_crawls_crawled_at_id ON crawls(crawled_at, id)")
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS table_counts (
+                name TEXT PRIMARY KEY,
+                count INTEGER NOT NULL
+            )
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_crawls_count_insert AFTER INSERT ON crawls
+            BEGIN
+                UPDATE table_counts SET count = count + 1 WHERE name = 'crawls';
+            END
+        """)
+        await db.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_crawls_count_delete AFTER DELETE ON crawls
+            BEGIN
+                UPDATE table_counts SET count = count - 1 WHERE name = 'crawls';
+            END
+        """)
+        # Counted once, when the triggers are first installed on an existing database.
+        await db.execute("INSERT OR IGNORE INTO table_counts (name, count) SELECT 'crawls', COUNT(*) FROM crawls")
+        # Full-text index over title and body_text. body_text is stored compressed,
+        # so the index reads its content through a view that decompresses it.
+        # Rows are indexed by insert_crawl_result() from the plaintext it
+        # already has, not by triggers: a trigger calling decompress() would
+        # break writes to crawls from any connection that has not registered it.
+        await db.execute("""
+            CREATE VIEW IF NOT EXISTS crawls_text AS
+            SELECT id, title, decompress(body_text) AS body_text FROM crawls
+        """)
+        await db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS crawls_fts USING fts5(
+                title, body_text,
+                content='crawls_text', content_rowid='id',
+                tokenize='porter unicode61 remove_diacritics 2'
+            )
+        """)
+        for trigger in ('insert', 'delete', 'update'):
+            await db.execute(f"DROP TRIGGER IF EXISTS trg_crawls_fts_{trigger}")
         await db.execute("""
             CREATE TABLE IF NOT EXISTS licenses (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -30,37 +102,711 @@ async def init_db():
             )
         """)
         await db.execute("CREATE INDEX IF NOT EXISTS idx_licenses_key ON licenses(key)")
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS url_state (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                last_changed TIMESTAMP,
+                last_seen TIMESTAMP
+            )
+        """)
+        # Non-HTML URLs found while crawling, left for a separate pipeline to fetch.
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                url TEXT PRIMARY KEY,
+                content_type TEXT,
+                content_length INTEGER,
+                job_id TEXT,
+                found_at TIMESTAMP
+            )
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS urls (
+                id INTEGER PRIMARY KEY,
+                url TEXT UNIQUE NOT NULL
+            )
+        """)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS edges (
+                src_id INTEGER NOT NULL,
+                dst_id INTEGER NOT NULL,
+                internal INTEGER NOT NULL,
+                PRIMARY KEY (src_id, dst_id)
+            ) WITHOUT ROWID
+        """)
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_edges_dst ON edges(dst_id, src_id)")
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                simhash INTEGER NOT NULL,
+                band0 INTEGER NOT NULL,
+                band1 INTEGER NOT NULL,
+                band2 INTEGER NOT NULL,
+                band3 INTEGER NOT NULL
+            )
+        """)
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_fingerprints_hash ON fingerprints(content_hash)")
+        for band in range(4):
+            await db.execute(f"CREATE INDEX IF NOT EXISTS idx_fingerprints_band{band} ON fingerprints(band{band})")
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_jobs (
+                id TEXT PRIMARY KEY,
+                license_key TEXT NOT NULL,
+                url TEXT NOT NULL,
+                max_depth INTEGER NOT NULL,
+                max_urls INTEGER NOT NULL,
+                incremental INTEGER NOT NULL DEFAULT 0,
+                shared INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                pages_crawled INTEGER NOT NULL DEFAULT 0,
+                pages_queued INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        """)
+        await add_column(db, 'crawl_jobs', 'incremental', 'INTEGER NOT NULL DEFAULT 0')
+        await add_column(db, 'crawl_jobs', 'shared', 'INTEGER NOT NULL DEFAULT 0')
+        # The process running a job and when it last said so; see JobManager.
+        await add_column(db, 'crawl_jobs', 'owner', 'TEXT')
+        await add_column(db, 'crawl_jobs', 'heartbeat', 'REAL')
+        # Checkpointed frontier of each crawl job, in queue order; see crawler/frontier.py.
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                id INTEGER PRIMARY KEY,
+                job_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                UNIQUE (job_id, url)
+            )
+        """)
+        await add_column(db, 'frontier', 'lease_owner', 'TEXT')
+        await add_column(db, 'frontier', 'lease_expires', 'REAL')
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_frontier_job_done ON frontier(job_id, done, id)")
+        # Serialized Bloom-filter seen set of a job, saved with each checkpoint when SEEN_SET=bloom.
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS frontier_seen (
+                job_id TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                last_id INTEGER NOT NULL
+            )
+        """)
         await db.commit()
     logger.info("Database initialized successfully")
 
 async def get_db():
-    db = await aiosqlite.connect(DB_NAME)
-    try:
+    """FastAPI dependency: a pooled reader connection held for one request."""
+    async with db_pool.reader() as db:
         yield db
-    finally:
-        await db.close()
 
-async def get_results(page, per_page):
-    offset = (page - 1) * per_page
-    async with aiosqlite.connect(DB_NAME) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT COUNT(*) as count FROM crawls") as cursor:
-            total_results = (await cursor.fetchone())['count']
-        query = """
-            SELECT id, url, depth, title, body_text, crawled_at
-            FROM crawls
-            ORDER BY crawled_at DESC
-            LIMIT ? OFFSET ?
-        """
-        async with db.execute(query, (per_page, offset)) as cursor:
-            results = [dict(row) for row in await cursor.fetchall()]
-    return results, total_results
-
-async def insert_crawl_result(url, depth, internal_links, external_links, title, body_text, crawled_at):
-    async with aiosqlite.connect(DB_NAME) as db:
+def encode_cursor(crawled_at, row_id):
+    raw = json.dumps([crawled_at, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        crawled_at, row_id = json.loads(raw)
+        return str(crawled_at), int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {token}")
+
+async def count_rows(table, db=None):
+    async with db_pool.reader(db) as db:
+        async with db.execute("SELECT count FROM table_counts WHERE name = ?", (table,)) as cursor:
+            row = await cursor.fetchone()
+    return row['count'] if row else 0
+
+def decode_row(row):
+    """dict(row) with any compressed columns it holds decompressed."""
+    row = dict(row)
+    for field in COMPRESSED_FIELDS:
+        if field in row:
+            row[field] = decompress_text(row[field])
+    return row
+
+async def get_results(page, per_page, db=None, after=None, include_body=True):
+    """Return one page of results, newest first, plus the total and the next cursor.
+
+    With after (a cursor from a previous call) the page is found by seeking
+    the (crawled_at, id) index, so deep pages cost the same as the first.
+    page is only used when no cursor is given. body_text is only read and
+    decompressed when include_body is set.
+    """
+    columns = "id, url, depth, title, body_text, crawled_at" if include_body else "id, url, depth, title, crawled_at"
+    async with db_pool.reader(db) as db:
+        total_results = await count_rows('crawls', db)
+        if after:
+            crawled_at, row_id = decode_cursor(after)
+            query = f"""
+                SELECT {columns}
+                FROM crawls
+                WHERE (crawled_at, id) < (?, ?)
+                ORDER BY crawled_at DESC, id DESC
+                LIMIT ?
+            """
+            params = (crawled_at, row_id, per_page)
+        else:
+            query = f"""
+                SELECT {columns}
+                FROM crawls
+                ORDER BY crawled_at DESC, id DESC
+                LIMIT ? OFFSET ?
+            """
+            params = (per_page, (page - 1) * per_page)
+        async with db.execute(query, params) as cursor:
+            results = [decode_row(row) for row in await cursor.fetchall()]
+
+    next_cursor = None
+    if results and len(results) == per_page:
+        next_cursor = encode_cursor(results[-1]['crawled_at'], results[-1]['id'])
+    return results, total_results, next_cursor
+
+async def search_results(query, page=1, per_page=20, db=None):
+    """Rank crawled pages against an FTS5 query, best match first.
+
+    Titles count five times as much as body text. Matches are wrapped in
+    <mark> in the returned title and in a short body_text snippet. Raises
+    ValueError if query is not valid FTS5 syntax.
+    """
+    async with db_pool.reader(db) as db:
+        try:
+            async with db.execute("""
+                SELECT c.id, c.url, c.depth, c.crawled_at, c.job_id,
+                       highlight(crawls_fts, 0, '<mark>', '</mark>') AS title,
+                       snippet(crawls_fts, 1, '<mark>', '</mark>', '…', 24) AS snippet,
+                       bm25(crawls_fts, 5.0, 1.0) AS score
+                FROM crawls_fts
+                JOIN crawls c ON c.id = crawls_fts.rowid
+                WHERE crawls_fts MATCH ?
+                ORDER BY score
+                LIMIT ? OFFSET ?
+            """, (query, per_page, (page - 1) * per_page)) as cursor:
+                rows = await cursor.fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid search query: {e}")
+    return [dict(row) for row in rows]
+
+async def rebuild_search_index():
+    """Re-index every crawl row, e.g. for databases that predate the search index."""
+    async with db_pool.writer() as db:
+        await db.execute("INSERT INTO crawls_fts (crawls_fts) VALUES ('rebuild')")
+        await db.execute("INSERT INTO crawls_fts (crawls_fts) VALUES ('optimize')")
+        await db.commit()
+    return await count_rows('crawls')
+
+async def iter_result_chunks(fields=EXPORT_FIELDS, job_id=None, since=None, until=None,
+                             min_depth=None, max_depth=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield matching crawl rows as lists of dicts, chunk_size rows at a time, in id order.
+
+    Each chunk seeks past the last id of the previous one and borrows a
+    reader only for that query, so a long export never pins a pooled
+    connection or holds the whole result in memory.
+    """
+    unknown = set(fields) - set(EXPORT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown export fields: {', '.join(sorted(unknown))}")
+
+    conditions, params = ["id > ?"], []
+    for clause, value in (("job_id = ?", job_id), ("crawled_at >= ?", since), ("crawled_at < ?", until),
+                          ("depth >= ?", min_depth), ("depth <= ?", max_depth)):
+        if value is not None:
+            conditions.append(clause)
+            params.append(value)
+
+    link_fields = [field for field in LINK_FIELDS if field in fields]
+    columns = ', '.join(dict.fromkeys(('id', 'url', *fields)))
+    query = f"""
+        SELECT {columns} FROM crawls
+        WHERE {' AND '.join(conditions)}
+        ORDER BY id
+        LIMIT ?
+    """
+    last_id = 0
+    while True:
+        async with db_pool.reader() as db:
+            async with db.execute(query, (last_id, *params, chunk_size)) as cursor:
+                rows = await cursor.fetchall()
+        if not rows:
+            return
+        last_id = rows[-1]['id']
+        chunk = [decode_row(row) for row in rows]
+        if link_fields:
+            await fill_links(chunk, link_fields)
+        yield [{name: row[name] for name in fields} for row in chunk]
+        if len(rows) < chunk_size:
+            return
+
+async def fill_links(rows, fields):
+    """Replace link columns with lists: parsed legacy JSON, or the url's edges for new rows."""
+    pending = {row['url'] for row in rows if any(row[field] is None for field in fields)}
+    graph = await get_link_map(pending) if pending else {}
+    for row in rows:
+        internal, external = graph.get(row['url'], ([], []))
+        for field in fields:
+            if row[field] is not None:
+                row[field] = json.loads(row[field])
+            else:
+                row[field] = internal if field == 'internal_links' else external
+
+# Queued right after the row's INSERT_CRAWL; url and crawled_at find that row
+# even when other pages' rows were written in between.
+INDEX_CRAWL = """
+    INSERT INTO crawls_fts (rowid, title, body_text)
+    VALUES ((SELECT max(id) FROM crawls WHERE url = ? AND crawled_at = ?), ?, ?)
+"""
+
+async def insert_crawl_result(url, depth, internal_links, external_links, title, body_text, crawled_at, job_id=None,
+                              content_hash=None, duplicate_of=None):
+    """Queue a crawl row. internal_links/external_links are legacy JSON columns;
+    the crawler passes None and records links with save_links() instead."""
+    await crawl_writer.submit((url, depth, compress_text(internal_links), compress_text(external_links), title,
+                               compress_text(body_text), crawled_at, job_id, content_hash, duplicate_of))
+    await crawl_writer.submit((url, crawled_at, title, body_text), INDEX_CRAWL)
+    logger.debug(f"Queued crawl result for URL: {url}")
+
+SAVE_URL_STATE = """
+    INSERT INTO url_state (url, etag, last_modified, content_hash, last_changed, last_seen)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET
+        etag = excluded.etag,
+        last_modified = excluded.last_modified,
+        content_hash = excluded.content_hash,
+        last_changed = excluded.last_changed,
+        last_seen = excluded.last_seen
+"""
+
+MARK_URL_SEEN = "UPDATE url_state SET last_seen = ? WHERE url = ?"
+
+async def get_url_state(url, db=None):
+    async with db_pool.reader(db) as db:
+        async with db.execute("SELECT * FROM url_state WHERE url = ?", (url,)) as cursor:
+            row = await cursor.fetchone()
+    return dict(row) if row else None
+
+async def save_url_state(url, etag, last_modified, content_hash, seen_at):
+    await crawl_writer.submit((url, etag, last_modified, content_hash, seen_at, seen_at), SAVE_URL_STATE)
+
+async def mark_url_seen(url, seen_at):
+    await crawl_writer.submit((seen_at, url), MARK_URL_SEEN)
+
+async def get_stored_links(url, db=None):
+    """Internal links from the latest stored crawl of url, or None if it was never stored."""
+    async with db_pool.reader(db) as db:
+        async with db.execute(
+            "SELECT internal_links FROM crawls WHERE url = ? ORDER BY id DESC LIMIT 1", (url,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        if row['internal_links'] is not None:
+            return json.loads(decompress_text(row['internal_links']))
+        links = await get_outlinks(url, internal=True, limit=None, db=db)
+    return [link['url'] for link in links]
+
+async def insert_job(job_id, license_key, url, max_depth, max_urls, incremental, status, created_at, shared=False,
+                     owner=None):
+    async with db_pool.writer() as db:
         await db.execute("""
-            INSERT INTO crawls (url, depth, internal_links, external_links, title, body_text, crawled_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (url, depth, internal_links, external_links, title, body_text, crawled_at))
+            INSERT INTO crawl_jobs (id, license_key, url, max_depth, max_urls, incremental, shared, status,
+                                    created_at, owner, heartbeat)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (job_id, license_key, url, max_depth, max_urls, int(incremental), int(shared), status, created_at,
+              owner, time.time()))
+        await db.commit()
+
+async def update_job(job_id, **fields):
+    unknown = set(fields) - set(JOB_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+    assignments = ', '.join(f"{name} = ?" for name in fields)
+    async with db_pool.writer() as db:
+        await db.execute(f"UPDATE crawl_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
         await db.commit()
-    logger.info(f"Inserted crawl result for URL: {url}")
\ No newline at end of file
+
+async def get_job(job_id, db=None):
+    async with db_pool.reader(db) as db:
+        async with db.execute("SELECT * FROM crawl_jobs WHERE id = ?", (job_id,)) as cursor:
+            row = await cursor.fetchone()
+    return dict(row) if row else None
+
+async def interrupt_unfinished_jobs(finished_at, ttl):
+    """Mark queued or running jobs whose owner has not sent a heartbeat for ttl
+    seconds as interrupted; returns their ids."""
+    async with db_pool.writer() as db:
+        async with db.execute("""
+            UPDATE crawl_jobs SET status = 'interrupted', finished_at = ?
+            WHERE status IN ('queued', 'running') AND (heartbeat IS NULL OR heartbeat < ?)
+            RETURNING id
+        """, (finished_at, time.time() - ttl)) as cursor:
+            job_ids = [row['id'] for row in await cursor.fetchall()]
+        await db.commit()
+    return job_ids
+
+async def renew_jobs(owner):
+    """Heartbeat owner's queued and running jobs; returns the ids of those still owned and unfinished."""
+    async with db_pool.writer() as db:
+        async with db.execute("""
+            UPDATE crawl_jobs SET heartbeat = ?
+            WHERE owner = ? AND status IN ('queued', 'running')
+            RETURNING id
+        """, (time.time(), owner)) as cursor:
+            job_ids = {row['id'] for row in await cursor.fetchall()}
+        await db.commit()
+    return job_ids
+
+async def claim_job(job_id, owner, statuses):
+    """Requeue a job in one of statuses under owner; returns its row, or None if it was in no such status."""
+    placeholders = ', '.join('?' for _ in statuses)
+    async with db_pool.writer() as db:
+        async with db.execute(f"""
+            UPDATE crawl_jobs SET status = 'queued', error = NULL, finished_at = NULL, owner = ?, heartbeat = ?
+            WHERE id = ? AND status IN ({placeholders})
+            RETURNING *
+        """, (owner, time.time(), job_id, *statuses)) as cursor:
+            row = await cursor.fetchone()
+        await db.commit()
+    return dict(row) if row else None
+
+async def start_job(job_id, owner, started_at):
+    """Move owner's queued job to running; False if it was cancelled or taken over meanwhile."""
+    async with db_pool.writer() as db:
+        async with db.execute("""
+            UPDATE crawl_jobs SET status = 'running', started_at = ?
+            WHERE id = ? AND owner = ? AND status = 'queued'
+            RETURNING id
+        """, (started_at, job_id, owner)) as cursor:
+            started = await cursor.fetchone() is not None
+        await db.commit()
+    return started
+
+async def finish_job(job_id, owner, status, pages_crawled, pages_queued, error, finished_at):
+    """Record how owner's job ended; returns the status stored, None if another process owns the job now.
+
+    A job cancelled from another process stays cancelled even if it went
+    on to complete before its owner noticed.
+    """
+    async with db_pool.writer() as db:
+        async with db.execute("""
+            UPDATE crawl_jobs SET status = CASE WHEN status = 'cancelled' THEN status ELSE ? END,
+                                  pages_crawled = ?, pages_queued = ?, error = ?, finished_at = ?
+            WHERE id = ? AND owner = ?
+            RETURNING status
+        """, (status, pages_crawled, pages_queued, error, finished_at, job_id, owner)) as cursor:
+            row = await cursor.fetchone()
+        await db.commit()
+    return row['status'] if row else None
+
+async def cancel_job(job_id, finished_at):
+    """Mark a queued or running job cancelled; its owner stops it at its next heartbeat."""
+    async with db_pool.writer() as db:
+        async with db.execute("""
+            UPDATE crawl_jobs SET status = 'cancelled', finished_at = ?
+            WHERE id = ? AND status IN ('queued', 'running')
+            RETURNING id
+        """, (finished_at, job_id)) as cursor:
+            cancelled = await cursor.fetchone() is not None
+        await db.commit()
+    return cancelled
+
+ADD_FRONTIER_URL = "INSERT OR IGNORE INTO frontier (job_id, url, depth) VALUES (?, ?, ?)"
+MARK_FRONTIER_DONE = """
+    UPDATE frontier SET done = 1, lease_owner = NULL, lease_expires = NULL WHERE job_id = ? AND url = ?
+"""
+
+# last_id is the newest frontier row when the filter is written; rows up to it
+# were all queued before the filter was serialized, so it contains their URLs.
+SAVE_FRONTIER_SEEN = """
+    INSERT OR REPLACE INTO frontier_seen (job_id, data, last_id)
+    VALUES (?1, ?2, (SELECT COALESCE(MAX(id), 0) FROM frontier WHERE job_id = ?1))
+"""
+
+FRONTIER_CHUNK_SIZE = 10000
+
+async def checkpoint_frontier(job_id, added, done, seen=None):
+    """Queue a frontier checkpoint: newly queued (url, depth) pairs, then URLs that
+    were crawled, then the serialized seen set if given.
+
+    All go through the crawl writer after the crawl rows of the pages they
+    follow, so a checkpoint never marks a page done before its row is stored.
+    """
+    await crawl_writer.submit_many([(job_id, url, depth) for url, depth in added], ADD_FRONTIER_URL)
+    await crawl_writer.submit_many([(job_id, url) for url in done], MARK_FRONTIER_DONE)
+    if seen is not None:
+        await crawl_writer.submit((job_id, seen), SAVE_FRONTIER_SEEN)
+
+async def iter_frontier(job_id, since_id=None, chunk_size=FRONTIER_CHUNK_SIZE):
+    """Yield (url, depth, done) for the URLs the job has queued, in queue order.
+
+    With since_id, only URLs not crawled yet plus every URL queued after row
+    since_id. Rows are read chunk_size at a time, each chunk on a briefly
+    borrowed reader.
+    """
+    condition, params = "", ()
+    if since_id is not None:
+        condition, params = "AND (done = 0 OR id > ?)", (since_id,)
+    last_id = 0
+    while True:
+        async with db_pool.reader() as db:
+            async with db.execute(f"""
+                SELECT id, url, depth, done FROM frontier
+                WHERE job_id = ? {condition} AND id > ?
+                ORDER BY id LIMIT ?
+            """, (job_id, *params, last_id, chunk_size)) as cursor:
+                rows = await cursor.fetchall()
+        for row in rows:
+            yield row['url'], row['depth'], bool(row['done'])
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1]['id']
+
+async def count_frontier_done(job_id, up_to_id, db=None):
+    async with db_pool.reader(db) as db:
+        async with db.execute("SELECT COUNT(*) FROM frontier WHERE job_id = ? AND done = 1 AND id <= ?",
+                              (job_id, up_to_id)) as cursor:
+            return (await cursor.fetchone())[0]
+
+async def load_frontier_seen(job_id, db=None):
+    """(data, last_id) of the job's last saved seen set, or None."""
+    async with db_pool.reader(db) as db:
+        async with db.execute("SELECT data, last_id FROM frontier_seen WHERE job_id = ?", (job_id,)) as cursor:
+            row = await cursor.fetchone()
+    return (row['data'], row['last_id']) if row else None
+
+async def claim_frontier(job_id, owner, limit, max_urls, lease_ttl):
+    """Lease up to limit queued URLs of a shared job to owner, oldest first.
+
+    URLs whose lease has expired, e.g. because their worker died, are
+    claimable again. No more is handed out than max_urls allows once crawled
+    and currently leased URLs are counted. Returns (claimed, crawled, finished):
+    the (url, depth) pairs leased, the job's crawled count, and whether the job
+    has nothing left to crawl or wait for.
+    """
+    now = time.time()
+    async with db_pool.writer() as db:
+        # IMMEDIATE takes the write lock up front, so counting and leasing are
+        # atomic with respect to other processes sharing the database.
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            async with db.execute("""
+                SELECT COUNT(*) FILTER (WHERE done = 1) AS crawled,
+                       COUNT(*) FILTER (WHERE done = 0) AS pending,
+                       COUNT(*) FILTER (WHERE done = 0 AND lease_expires > ?) AS leased
+                FROM frontier WHERE job_id = ?
+            """, (now, job_id)) as cursor:
+                row = await cursor.fetchone()
+            crawled, pending, leased = row['crawled'], row['pending'], row['leased']
+
+            claimed = []
+            budget = min(limit, max_urls - crawled - leased)
+            if budget > 0:
+                async with db.execute("""
+                    UPDATE frontier SET lease_owner = ?, lease_expires = ?
+                    WHERE id IN (
+                        SELECT id FROM frontier
+                        WHERE job_id = ? AND done = 0 AND (lease_expires IS NULL OR lease_expires <= ?)
+                        ORDER BY id LIMIT ?
+                    )
+                    RETURNING id, url, depth
+                """, (owner, now + lease_ttl, job_id, now, budget)) as cursor:
+                    claimed = sorted(await cursor.fetchall(), key=lambda r: r['id'])
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+
+    finished = pending == 0 or (crawled >= max_urls and leased == 0)
+    return [(r['url'], r['depth']) for r in claimed], crawled, finished
+
+async def renew_leases(job_id, owner, lease_ttl):
+    async with db_pool.writer() as db:
+        await db.execute("UPDATE frontier SET lease_expires = ? WHERE job_id = ? AND lease_owner = ? AND done = 0",
+                         (time.time() + lease_ttl, job_id, owner))
+        await db.commit()
+
+async def release_leases(job_id, owner):
+    """Give owner's unfinished URLs back so other workers can claim them straight away."""
+    async with db_pool.writer() as db:
+        await db.execute("""
+            UPDATE frontier SET lease_owner = NULL, lease_expires = NULL
+            WHERE job_id = ? AND lease_owner = ? AND done = 0
+        """, (job_id, owner))
+        await db.commit()
+
+async def delete_frontier(job_id):
+    async with db_pool.writer() as db:
+        await db.execute("DELETE FROM frontier WHERE job_id = ?", (job_id,))
+        await db.execute("DELETE FROM frontier_seen WHERE job_id = ?", (job_id,))
+        await db.commit()
+
+SAVE_FINGERPRINT = """
+    INSERT OR REPLACE INTO fingerprints (url, content_hash, simhash, band0, band1, band2, band3)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+async def save_fingerprint(url, content_hash, simhash):
+    await crawl_writer.submit((url, content_hash, to_signed(simhash), *bands(simhash)), SAVE_FINGERPRINT)
+
+# Candidates checked per band; oldest pages first, so the original wins over later copies.
+BAND_CANDIDATES = 100
+
+async def find_near_duplicate(url, content_hash, simhash, distance, db=None):
+    """URL of a stored page with the same text or a simhash within distance bits, if any.
+
+    The exact text match is its own indexed lookup, so band collisions can
+    never crowd it out; each band is then searched separately with its own
+    candidate cap.
+    """
+    async with db_pool.reader(db) as db:
+        async with db.execute("SELECT url FROM fingerprints WHERE content_hash = ? AND url != ? LIMIT 1",
+                              (content_hash, url)) as cursor:
+            row = await cursor.fetchone()
+        if row is not None:
+            return row['url']
+        for band, value in enumerate(bands(simhash)):
+            async with db.execute(f"""
+                SELECT url, simhash FROM fingerprints
+                WHERE band{band} = ? AND url != ?
+                ORDER BY rowid LIMIT ?
+            """, (value, url, BAND_CANDIDATES)) as cursor:
+                rows = await cursor.fetchall()
+            for row in rows:
+                if hamming(simhash, from_signed(row['simhash'])) <= distance:
+                    return row['url']
+    return None
+
+async def compress_existing_rows(batch_size=500):
+    """Compress crawl rows stored before compression was enabled; returns rows updated."""
+    updated = 0
+    last_id = 0
+    while True:
+        async with db_pool.reader() as db:
+            async with db.execute("""
+                SELECT id, body_text, internal_links, external_links FROM crawls
+                WHERE id > ? ORDER BY id LIMIT ?
+            """, (last_id, batch_size)) as cursor:
+                rows = await cursor.fetchall()
+        if not rows:
+            return updated
+        last_id = rows[-1]['id']
+
+        changes = []
+        for row in rows:
+            values = [row[field] for field in COMPRESSED_FIELDS]
+            if any(isinstance(value, str) for value in values):
+                changes.append((*(compress_text(value) if isinstance(value, str) else value for value in values),
+                                row['id']))
+        if changes:
+            async with db_pool.writer() as db:
+                await db.executemany(
+                    "UPDATE crawls SET body_text = ?, internal_links = ?, external_links = ? WHERE id = ?", changes)
+                await db.commit()
+            updated += len(changes)
+            logger.info(f"Compressed {updated} crawl rows so far")
+
+SAVE_DOCUMENT = """
+    INSERT OR REPLACE INTO documents (url, content_type, content_length, job_id, found_at)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+async def save_document(url, content_type, content_length, job_id, found_at):
+    await crawl_writer.submit((url, content_type, content_length, job_id, found_at), SAVE_DOCUMENT)
+
+INSERT_URL = "INSERT OR IGNORE INTO urls (url) VALUES (?)"
+DELETE_EDGES = "DELETE FROM edges WHERE src_id = (SELECT id FROM urls WHERE url = ?)"
+INSERT_EDGE = """
+    INSERT OR IGNORE INTO edges (src_id, dst_id, internal)
+    VALUES ((SELECT id FROM urls WHERE url = ?), (SELECT id FROM urls WHERE url = ?), ?)
+"""
+
+async def save_links(url, internal_links, external_links):
+    """Replace url's outgoing edges in the link graph."""
+    links = [(link, 1) for link in internal_links] + [(link, 0) for link in external_links]
+    await crawl_writer.submit_many([(url,)] + [(link,) for link, _ in links], INSERT_URL)
+    await crawl_writer.submit((url,), DELETE_EDGES)
+    await crawl_writer.submit_many([(url, link, internal) for link, internal in links], INSERT_EDGE)
+
+async def get_outlinks(url, internal=None, limit=100, after=0, db=None):
+    """Links out of url as {id, url, internal}, in id order; after is the last id of the previous page."""
+    return await _get_neighbours(url, 'src_id', 'dst_id', internal, limit, after, db)
+
+async def get_inlinks(url, internal=None, limit=100, after=0, db=None):
+    """Pages linking to url as {id, url, internal}, in id order; after is the last id of the previous page."""
+    return await _get_neighbours(url, 'dst_id', 'src_id', internal, limit, after, db)
+
+async def _get_neighbours(url, own, other, internal, limit, after, db):
+    conditions = [f"e.{own} = (SELECT id FROM urls WHERE url = ?)", f"e.{other} > ?"]
+    params = [url, after or 0]
+    if internal is not None:
+        conditions.append("e.internal = ?")
+        params.append(int(internal))
+    query = f"""
+        SELECT u.id, u.url, e.internal FROM edges e
+        JOIN urls u ON u.id = e.{other}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY e.{other}
+    """
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    async with db_pool.reader(db) as db:
+        async with db.execute(query, params) as cursor:
+            rows = await cursor.fetchall()
+    return [{'id': row['id'], 'url': row['url'], 'internal': bool(row['internal'])} for row in rows]
+
+async def get_link_map(urls, db=None):
+    """{url: (internal links, external links)} from the link graph for each of urls."""
+    urls = list(urls)
+    placeholders = ', '.join('?' * len(urls))
+    graph = {url: ([], []) for url in urls}
+    async with db_pool.reader(db) as db:
+        async with db.execute(f"""
+            SELECT s.url AS src, d.url AS dst, e.internal FROM urls s
+            JOIN edges e ON e.src_id = s.id
+            JOIN urls d ON d.id = e.dst_id
+            WHERE s.url IN ({placeholders})
+        """, urls) as cursor:
+            async for row in cursor:
+                graph[row['src']][0 if row['internal'] else 1].append(row['dst'])
+    return graph
+
+async def backfill_link_graph(drop_json=False, batch_size=500):
+    """Load legacy JSON link columns into the link graph; returns rows processed.
+
+    Rows are replayed in id order so the latest crawl of a URL wins. With
+    drop_json the JSON columns are cleared once their links are in the graph.
+    """
+    processed = 0
+    last_id = 0
+    while True:
+        async with db_pool.reader() as db:
+            async with db.execute("""
+                SELECT id, url, internal_links, external_links FROM crawls
+                WHERE id > ? AND (internal_links IS NOT NULL OR external_links IS NOT NULL)
+                ORDER BY id LIMIT ?
+            """, (last_id, batch_size)) as cursor:
+                rows = await cursor.fetchall()
+        if not rows:
+            return processed
+        last_id = rows[-1]['id']
+
+        for row in rows:
+            internal = json.loads(decompress_text(row['internal_links']) or '[]')
+            external = json.loads(decompress_text(row['external_links']) or '[]')
+            await save_links(row['url'], internal, external)
+        await crawl_writer.flush()
+
+        if drop_json:
+            async with db_pool.writer() as db:
+                await db.executemany("UPDATE crawls SET internal_links = NULL, external_links = NULL WHERE id = ?",
+                                     [(row['id'],) for row in rows])
+                await db.commit()
+        processed += len(rows)
+        logger.info(f"Loaded links from {processed} crawl rows into the link graph")
@@ -0,0 +1,93 @@
+# pool.py
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+import aiosqlite
+from config import DB_NAME, DB_READERS, WRITE_BUSY_TIMEOUT
+from database.compression import decompress_text
+
+logger = logging.getLogger(__name__)
+
+async def register_functions(conn):
+    """SQL functions the schema relies on; every connection that touches crawls needs them."""
+    await conn.create_function('decompress', 1, decompress_text, deterministic=True)
+
+class DatabasePool:
+    """Long-lived SQLite connections shared by the whole application.
+
+    Readers are handed out one request at a time from a queue. All writes go
+    through a single writer connection, serialized by a lock, which is what
+    SQLite allows anyway. WAL mode lets readers run while a write is open.
+    """
+
+    def __init__(self, db_name=DB_NAME, readers=DB_READERS):
+        self.db_name = db_name
+        self.size = max(1, readers)
+        self.readers = None
+        self.connections = []
+        self.write_conn = None
+        self.write_lock = asyncio.Lock()
+        self.open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self):
+        return self.write_conn is not None
+
+    async def open(self):
+        async with self.open_lock:
+            if self.is_open:
+                return
+            # Other processes (shared-job workers, maintenance commands) may hold the write lock.
+            write_conn = await aiosqlite.connect(self.db_name, timeout=WRITE_BUSY_TIMEOUT)
+            await write_conn.execute("PRAGMA journal_mode=WAL")
+            await write_conn.execute("PRAGMA synchronous=NORMAL")
+            write_conn.row_factory = aiosqlite.Row
+            await register_functions(write_conn)
+
+            self.readers = asyncio.Queue()
+            for _ in range(self.size):
+                conn = await aiosqlite.connect(self.db_name)
+                await conn.execute("PRAGMA query_only=ON")
+                conn.row_factory = aiosqlite.Row
+                await register_functions(conn)
+                self.connections.append(conn)
+                self.readers.put_nowait(conn)
+
+            self.write_conn = write_conn
+            logger.info(f"Database pool opened with {self.size} readers")
+
+    async def close(self):
+        async with self.open_lock:
+            if not self.is_open:
+                return
+            for conn in self.connections:
+                await conn.close()
+            await self.write_conn.close()
+            self.connections = []
+            self.readers = None
+            self.write_conn = None
+            logger.info("Database pool closed")
+
+    @asynccontextmanager
+    async def reader(self, db=None):
+        """Borrow a reader connection, or reuse db if the caller already holds one."""
+        if db is not None:
+            yield db
+            return
+        if not self.is_open:
+            await self.open()
+        conn = await self.readers.get()
+        try:
+            yield conn
+        finally:
+            if self.readers is not None:
+                self.readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        if not self.is_open:
+            await self.open()
+        async with self.write_lock:
+            yield self.write_conn
+
+db_pool = DatabasePool()
@@ -0,0 +1,171 @@
+# writer.py
+import asyncio
+import logging
+import sqlite3
+import time
+from itertools import groupby
+from database.pool import db_pool
+from utils.metrics import store_seconds, write_batch_size, write_queue_size
+from config import WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, WRITE_QUEUE_SIZE, WRITE_RETRIES
+
+logger = logging.getLogger(__name__)
+
+INSERT_CRAWL = """
+    INSERT INTO crawls (url, depth, internal_links, external_links, title, body_text, crawled_at, job_id,
+                        content_hash, duplicate_of)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_STOP = object()
+_FLUSH = object()
+
+RETRY_DELAY = 0.5
+
+class WriteError(Exception):
+    """Raised by flush() when queued writes could not be committed."""
+
+def is_transient(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+class CrawlWriter:
+    """Write-behind writer for crawl results.
+
+    Statements are queued by the crawler and committed on the pool's writer
+    connection by a single long-lived task, in batches of up to batch_size
+    queue items or whatever arrived within flush_interval seconds of the
+    first one. Runs of the same statement in a batch go through one
+    executemany call, in submission order. A batch that fails because the
+    database is locked is retried up to retries times; one that still
+    fails is dropped and counted in failed, and flush() raises WriteError.
+    """
+
+    def __init__(self, pool=db_pool, batch_size=WRITE_BATCH_SIZE,
+                 flush_interval=WRITE_FLUSH_INTERVAL, queue_size=WRITE_QUEUE_SIZE, retries=WRITE_RETRIES):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.retries = retries
+        self.failed = 0
+        self.queue = None
+        self.task = None
+        self.lock = asyncio.Lock()
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    async def start(self):
+        async with self.lock:
+            if self.running:
+                return
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+            self.task = asyncio.create_task(self._run())
+            logger.info("Crawl writer started")
+
+    async def submit(self, params, sql=INSERT_CRAWL):
+        if not self.running:
+            await self.start()
+        # A full queue blocks the crawler until the writer catches up.
+        await self.queue.put((sql, [params]))
+
+    async def submit_many(self, rows, sql):
+        """Queue one statement over many parameter rows as a single item."""
+        rows = list(rows)
+        if not rows:
+            return
+        if not self.running:
+            await self.start()
+        await self.queue.put((sql, rows))
+
+    async def flush(self):
+        """Wait until every row submitted so far is committed.
+
+        Raises WriteError if any batch was dropped in the meantime.
+        """
+        if self.running:
+            failed = self.failed
+            # Cut the current batch short instead of waiting out flush_interval.
+            await self.queue.put(_FLUSH)
+            await self.queue.join()
+            if self.failed > failed:
+                raise WriteError(f"{self.failed - failed} crawl writes could not be committed")
+
+    async def close(self):
+        async with self.lock:
+            if not self.running:
+                return
+            await self.queue.put(_STOP)
+            await self.task
+            self.task = None
+            logger.info("Crawl writer stopped")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            row = await self.queue.get()
+            if row is _FLUSH:
+                self.queue.task_done()
+                continue
+            if row is _STOP:
+                self.queue.task_done()
+                break
+
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    row = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if row is _FLUSH or row is _STOP:
+                    self.queue.task_done()
+                    stopping = row is _STOP
+                    break
+                batch.append(row)
+
+            await self._write(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    async def _write(self, batch):
+        write_batch_size.observe(len(batch))
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                await self._commit(batch)
+                break
+            except Exception as e:
+                if is_transient(e) and attempt < self.retries:
+                    delay = RETRY_DELAY * 2 ** attempt
+                    attempt += 1
+                    logger.warning(f"Database busy writing {len(batch)} crawl writes, retrying in {delay}s")
+                    await asyncio.sleep(delay)
+                    continue
+                logger.error(f"Error writing {len(batch)} crawl writes: {str(e)}")
+                self.failed += len(batch)
+                break
+        store_seconds.observe(time.perf_counter() - started)
+
+    async def _commit(self, batch):
+        async with self.pool.writer() as db:
+            try:
+                for sql, group in groupby(batch, key=lambda item: item[0]):
+                    await db.executemany(sql, [params for _, rows in group for params in rows])
+                await db.commit()
+                logger.debug(f"Committed {len(batch)} crawl writes")
+            except Exception:
+                await db.rollback()
+                raise
+
+crawl_writer = CrawlWriter()
+write_queue_size.collect_with(lambda: crawl_writer.queue.qsize() if crawl_writer.queue is not None else 0)
@@ -3,22 +3,46 @@ import logging
 from datetime import datetime, timedelta
 import aiosqlite
 import secrets
-from config import DB_NAME
+from database.pool import db_pool
+from utils.helpers import TTLCache, MISSING
+from config import LICENSE_CACHE_SIZE, LICENSE_CACHE_TTL, LICENSE_CACHE_NEGATIVE_TTL
 
 logger = logging.getLogger(__name__)
 
-async def is_valid_license(key):
-    logger.debug(f"Checking license key: {key}")
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute("SELECT * FROM licenses WHERE key = ?", (key,)) as cursor:
+# key -> (type, expiration datetime), or None for keys that do not exist.
+# Writes in this module drop the affected key; the TTL bounds staleness from
+# writes made by other processes.
+license_cache = TTLCache(LICENSE_CACHE_SIZE, LICENSE_CACHE_TTL)
+
+async def get_license(key, db=None):
+    cached = license_cache.get(key)
+    if cached is not MISSING:
+        return cached
+
+    async with db_pool.reader(db) as db:
+        async with db.execute("SELECT type, expiration FROM licenses WHERE key = ?", (key,)) as cursor:
             license = await cursor.fetchone()
-            
+
+    if not license:
+        license_cache.set(key, None, LICENSE_CACHE_NEGATIVE_TTL)
+        return None
+
+    expiration = datetime.fromisoformat(license[1]) if license[1] else None
+    entry = (license[0], expiration)
+    license_cache.set(key, entry)
+    return entry
+
+async def is_valid_license(key, db=None):
+    logger.debug(f"Checking license key: {key}")
+    license = await get_license(key, db)
+
     if not license:
         logger.warning(f"License key not found: {key}")
         return False
-    
-    if license[2] == 'subscription':
-        is_valid = datetime.now() < datetime.fromisoformat(license[3])
+
+    license_type, expiration = license
+    if license_type == 'subscription':
+        is_valid = expiration is not None and datetime.now() < expiration
         logger.debug(f"Subscription license valid: {is_valid}")
         return is_valid
     
@@ -35,10 +59,16 @@ async def create_license(key, license_type, expiration=None):
     logger.debug(f"Creating license: key={key}, type={license_type}, expiration={expiration}")
     
     try:
-        async with aiosqlite.connect(DB_NAME) as db:
-            await db.execute("INSERT INTO licenses (key, type, expiration) VALUES (?, ?, ?)",
-                             (key, license_type, expiration))
-            await db.commit()
+        async with db_pool.writer() as db:
+            try:
+                await db.execute("INSERT INTO licenses (key, type, expiration) VALUES (?, ?, ?)",
+                                 (key, license_type, expiration))
+                await db.commit()
+            except Exception:
+                # The writer connection is shared, so never leave a failed transaction open on it.
+                await db.rollback()
+                raise
+        license_cache.pop(key)
         logger.info(f"License created successfully: {key}")
         return key
     except aiosqlite.IntegrityError:
@@ -50,11 +80,12 @@ async def create_license(key, license_type, expiration=None):
 
 async def revoke_license(key):
     logger.debug(f"Revoking license: {key}")
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("DELETE FROM licenses WHERE key = ?", (key,))
-        changes = db.total_changes
+    async with db_pool.writer() as db:
+        cursor = await db.execute("DELETE FROM licenses WHERE key = ?", (key,))
+        changes = cursor.rowcount
         await db.commit()
-    
+    license_cache.pop(key)
+
     if changes:
         logger.info(f"License revoked successfully: {key}")
         return True
@@ -64,11 +95,12 @@ async def revoke_license(key):
 
 async def update_license_expiration(key, new_expiration):
     logger.debug(f"Updating license expiration: key={key}, new_expiration={new_expiration}")
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("UPDATE licenses SET expiration = ? WHERE key = ?", (new_expiration, key))
-        changes = db.total_changes
+    async with db_pool.writer() as db:
+        cursor = await db.execute("UPDATE licenses SET expiration = ? WHERE key = ?", (new_expiration, key))
+        changes = cursor.rowcount
         await db.commit()
-    
+    license_cache.pop(key)
+
     if changes:
         logger.info(f"License expiration updated successfully: {key}")
         return True
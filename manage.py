@@ -0,0 +1,106 @@
+# manage.py
+import argparse
+import asyncio
+import logging
+from termcolor import colored
+from config import CRAWL_WORKERS, FRONTIER_POLL_INTERVAL
+from crawler.crawler import crawl
+from crawler.parser import parse_pool
+from crawler.client import http_client
+from crawler.render import browser_pool
+from database.db import init_db, compress_existing_rows, backfill_link_graph, rebuild_search_index, get_job
+from database.writer import crawl_writer
+from database.pool import db_pool
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+async def compress(args):
+    updated = await compress_existing_rows(args.batch_size)
+    print(colored(f"Compressed {updated} crawl rows.", 'green'))
+
+async def links(args):
+    await crawl_writer.start()
+    try:
+        processed = await backfill_link_graph(args.drop_json, args.batch_size)
+    finally:
+        await crawl_writer.close()
+    print(colored(f"Loaded links from {processed} crawl rows into the link graph.", 'green'))
+
+async def search_index(args):
+    indexed = await rebuild_search_index()
+    print(colored(f"Rebuilt the search index over {indexed} crawl rows.", 'green'))
+
+STOPPED = ('completed', 'failed', 'cancelled')
+
+async def watch_job(job_id, crawl_task):
+    while not crawl_task.done():
+        await asyncio.sleep(FRONTIER_POLL_INTERVAL)
+        job = await get_job(job_id)
+        if job is None or job['status'] in STOPPED:
+            crawl_task.cancel()
+            return
+
+async def worker(args):
+    job = await get_job(args.job_id)
+    if job is None or not job['shared']:
+        print(colored(f"{args.job_id} is not a shared crawl job.", 'red'))
+        return
+    if job['status'] in STOPPED:
+        print(colored(f"Crawl job {args.job_id} is already {job['status']}.", 'red'))
+        return
+
+    await crawl_writer.start()
+    try:
+        crawl_task = asyncio.create_task(crawl(job['url'], job['max_depth'], job['max_urls'], args.workers,
+                                               job_id=job['id'], incremental=bool(job['incremental']),
+                                               shared=True))
+        watcher = asyncio.create_task(watch_job(job['id'], crawl_task))
+        try:
+            pages = await crawl_task
+            print(colored(f"Crawl job {job['id']} has no URLs left: {pages} URLs crawled.", 'green'))
+        except asyncio.CancelledError:
+            print(colored(f"Crawl job {job['id']} was stopped.", 'yellow'))
+        finally:
+            watcher.cancel()
+    finally:
+        await http_client.close()
+        await browser_pool.close()
+        parse_pool.close()
+        await crawl_writer.close()
+
+COMMANDS = {
+    'compress': compress,
+    'links': links,
+    'search-index': search_index,
+    'worker': worker,
+}
+
+async def run(args):
+    await init_db()
+    try:
+        await COMMANDS[args.command](args)
+    finally:
+        await db_pool.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="qMiner maintenance commands")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compress_parser = subparsers.add_parser('compress', help="Compress crawl rows stored as plain text")
+    compress_parser.add_argument('--batch-size', type=int, default=500)
+
+    links_parser = subparsers.add_parser('links', help="Load legacy JSON link columns into the link graph")
+    links_parser.add_argument('--batch-size', type=int, default=500)
+    links_parser.add_argument('--drop-json', action='store_true',
+                              help="Clear the JSON link columns once their links are loaded")
+
+    subparsers.add_parser('search-index', help="Rebuild the full-text search index from the crawls table")
+
+    worker_parser = subparsers.add_parser('worker', help="Help crawl a shared crawl job")
+    worker_parser.add_argument('job_id')
+    worker_parser.add_argument('--workers', type=int, default=CRAWL_WORKERS)
+
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,20 @@
 import os
 import sys
 import socket
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from termcolor import colored
 from config import SECRET_KEY, ALLOWED_HOSTS, DEBUG
 from database.db import init_db
+from database.pool import db_pool
+from database.writer import crawl_writer
 from api.endpoints import router as api_router
+from crawler.jobs import job_manager
+from crawler.parser import parse_pool
+from crawler.client import http_client
+from crawler.render import browser_pool
+from utils.metrics import http_request_seconds
 import asyncio
 import uvicorn
 import signal
@@ -28,6 +36,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (/crawl/{job_id}), not the raw path, to keep the series count bounded.
+        route = request.scope.get('route')
+        http_request_seconds.observe(time.perf_counter() - started, request.method,
+                                     route.path if route is not None else 'unmatched', status)
+
 # Include API routes
 app.include_router(api_router)
 
@@ -35,12 +57,21 @@ app.include_router(api_router)
 async def startup_event():
     logger.info(colored("🕷️ qMiner web crawler initializing...", 'green'))
     await init_db()
+    await db_pool.open()
+    await crawl_writer.start()
+    await http_client.start()
+    await job_manager.start()
     logger.info(colored("🕷️ qMiner web crawler initialized", 'green'))
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info(colored("🕷️ qMiner web crawler shutting down...", 'yellow'))
-    # Add any cleanup tasks here
+    await job_manager.close()
+    await http_client.close()
+    await browser_pool.close()
+    parse_pool.close()
+    await crawl_writer.close()
+    await db_pool.close()
 
 def signal_handler(sig, frame):
     logger.info(colored("\n🛑 Stopping qMiner...", 'red'))
@@ -0,0 +1,28 @@
+# test_parser.py
+import pytest
+
+pytest.importorskip('lxml')
+
+from crawler.parser import parse_with_bs4, parse_with_lxml
+
+URL = 'http://example.com/'
+
+PAGES = [
+    '<html><body><p>caf&eacute; na&iuml;ve</p></body></html>',
+    '<html><body><p>&#233;t&#xE9; AT&amp;T &lt;tag&gt;</p></body></html>',
+    '<html><body><p>one<b>two</b>three<!-- note -->four</p><script>var x;</script></body></html>',
+    '<html><head><title>T&eacute;st</title></head><body><a href="/a">l&iacute;nk</a></body></html>',
+    '<html><body><p>' + 'word&amp;' * 2000 + ' ' + 'x' * 5000 + ' end</p></body></html>',
+]
+
+@pytest.mark.parametrize('html', PAGES, ids=['named-entities', 'numeric-entities', 'inline-tags', 'title-and-links', 'long-text'])
+def test_lxml_matches_bs4(html):
+    expected = parse_with_bs4(html, URL)
+    page = parse_with_lxml(html, URL)
+    assert page.body_text == expected.body_text
+    assert page.title == expected.title
+    assert page.links == expected.links
+
+def test_lxml_keeps_long_words_whole():
+    page = parse_with_lxml('<html><body><p>' + 'x' * 5000 + '</p></body></html>', URL)
+    assert page.body_text == 'x' * 5000
@@ -0,0 +1,42 @@
+# helpers.py
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+class TTLCache:
+    """Small LRU cache whose entries also expire after a TTL.
+
+    get() returns MISSING on a miss so that None can be cached as a value.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return MISSING
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self.entries[key]
+            return MISSING
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def pop(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
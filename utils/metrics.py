@@ -0,0 +1,176 @@
+# metrics.py
+import bisect
+import math
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BATCH_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 200, 500, 1000)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def samples(self):
+        """Yield (suffix, label values, extra label pairs, value) tuples."""
+        raise NotImplementedError
+
+    def render(self):
+        help = self.help.replace('\\', '\\\\').replace('\n', '\\n')
+        lines = [f"# HELP {self.name} {help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_labels(self.labels, values, extra)} {_number(value)}")
+        return lines
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        if not self.labels and not self.values:
+            yield '', (), (), 0
+        for values, value in self.values.items():
+            yield '', values, (), value
+
+class Gauge(Metric):
+    """A value that goes up and down.
+
+    Either updated with set()/inc()/dec(), or read at scrape time from a
+    function set with collect_with(), returning a number or, for a labelled
+    gauge, a dict of label-value tuples to numbers.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.values = {}
+        self.function = None
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def collect_with(self, function):
+        self.function = function
+
+    def samples(self):
+        values = self.values
+        if self.function is not None:
+            values = self.function()
+            if not isinstance(values, dict):
+                values = {(): values}
+        if not self.labels and not values:
+            yield '', (), (), 0
+        for labels, value in values.items():
+            yield '', labels, (), value
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed buckets.
+
+    observe() bumps one bucket count and the sum; counts are only made
+    cumulative, as the exposition format wants them, when scraped.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}
+
+    def observe(self, value, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                yield '_bucket', labels, (('le', _number(bound)),), cumulative
+            yield '_sum', labels, (), total
+            yield '_count', labels, (), cumulative
+
+class Registry:
+    """The metrics a process exports, rendered in the Prometheus text format.
+
+    Updating a metric is a dict lookup and an addition, with no locks:
+    every update happens on the event loop thread (parsing and database
+    work run elsewhere, but are timed from the loop), so updates never
+    interleave.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+fetches = registry.counter('qminer_fetches_total', "Page fetches by fetch mode and HTTP status; "
+                           "status is \"error\" when no response or body arrived", ('mode', 'status'))
+fetched_bytes = registry.counter('qminer_fetched_bytes_total', "Response body bytes downloaded", ('mode',))
+fetch_seconds = registry.histogram('qminer_fetch_seconds', "Time to fetch a page, body included", ('mode',))
+parse_seconds = registry.histogram('qminer_parse_seconds', "Time to parse a page, waiting for the parse pool included")
+store_seconds = registry.histogram('qminer_store_seconds', "Time to commit one batch of crawl writes")
+write_batch_size = registry.histogram('qminer_write_batch_size', "Queued crawl writes committed per transaction",
+                                      buckets=BATCH_BUCKETS)
+write_queue_size = registry.gauge('qminer_write_queue_size', "Crawl writes waiting for the writer")
+frontier_size = registry.gauge('qminer_frontier_size', "URLs queued in each running crawl's frontier; "
+                               "job is empty for crawls outside a job", ('job',))
+crawl_workers = registry.gauge('qminer_crawl_workers', "Crawl workers running")
+busy_workers = registry.gauge('qminer_crawl_workers_busy', "Crawl workers processing a page")
+http_request_seconds = registry.histogram('qminer_http_request_seconds', "API request latency by route",
+                                          ('method', 'route', 'status'))